@@ -3,7 +3,34 @@ import fs from 'fs';
 import path from 'path';
 import { csvParse } from 'd3-dsv';
 
-export async function GET() {
+// When set, serve the backend's precomputed /snapshot (real 24h change, ETag) instead of parsing the CSV.
+const BACKEND_URL = process.env.BACKEND_URL;
+
+async function fromBackend(req: Request): Promise<Response> {
+  const ifNoneMatch = req.headers.get('if-none-match');
+  const res = await fetch(`${BACKEND_URL}/snapshot`, {
+    headers: ifNoneMatch ? { 'If-None-Match': ifNoneMatch } : {},
+    cache: 'no-store',
+  });
+  const headers: Record<string, string> = { 'Cache-Control': 'no-cache' };
+  const etag = res.headers.get('etag');
+  if (etag) headers.ETag = etag;
+  if (res.status === 304) return new Response(null, { status: 304, headers });
+  return new Response(await res.text(), {
+    status: res.status,
+    headers: { ...headers, 'Content-Type': 'application/json' },
+  });
+}
+
+export async function GET(req: Request) {
+  if (BACKEND_URL) {
+    try {
+      return await fromBackend(req);
+    } catch {
+      // backend unreachable — fall back to the CSV below
+    }
+  }
+
   const csvPath = path.join(process.cwd(), 'backend', 'filtered_collections.csv');
   const text = fs.readFileSync(csvPath, 'utf-8');
   const records = csvParse(text);
@@ -13,14 +40,18 @@ export async function GET() {
     const floor = stats.total.floor_price as number;
 
     const parsedChange = rec.change1d ? parseFloat(rec.change1d) : NaN;
-    const change = isNaN(parsedChange)
-      ? Math.random() * 90 - 35
-      : parsedChange;
+    // mock values only without a backend; when it is just unreachable the change is unknown
+    const change = !isNaN(parsedChange)
+      ? parsedChange
+      : BACKEND_URL
+        ? null
+        : Math.random() * 90 - 35;
     return {
+      slug: rec.collection_slug as string,
       name: info.name as string,
       image: info.image_url as string,
       floorEth: floor,
-      change24hPct: Math.round(change * 100) / 100,
+      change24hPct: change === null ? null : Math.round(change * 100) / 100,
       link: info.opensea_url as string | undefined,
     };
   });
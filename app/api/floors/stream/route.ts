@@ -0,0 +1,22 @@
+// Proxies the backend's floor change stream (GET /events/floors, server-sent events).
+const BACKEND_URL = process.env.BACKEND_URL;
+
+export const dynamic = 'force-dynamic';
+
+export async function GET(req: Request) {
+  // no backend: 204 tells EventSource not to reconnect
+  if (!BACKEND_URL) return new Response(null, { status: 204 });
+  try {
+    const res = await fetch(`${BACKEND_URL}/events/floors`, { cache: 'no-store', signal: req.signal });
+    if (!res.ok || !res.body) return new Response(null, { status: 204 });
+    return new Response(res.body, {
+      headers: {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache, no-transform',
+        Connection: 'keep-alive',
+      },
+    });
+  } catch {
+    return new Response(null, { status: 204 });
+  }
+}
@@ -0,0 +1,27 @@
+// Proxies the backend's thumbnail cache (GET /images/{key}); its long-lived Cache-Control is passed through.
+const BACKEND_URL = process.env.BACKEND_URL;
+
+export async function GET(req: Request, { params }: { params: { key: string } }) {
+  if (!BACKEND_URL) return new Response(null, { status: 404 });
+  const size = new URL(req.url).searchParams.get('size') ?? '';
+  try {
+    const res = await fetch(
+      `${BACKEND_URL}/images/${encodeURIComponent(params.key)}?size=${encodeURIComponent(size)}`,
+      { redirect: 'manual', cache: 'no-store' },
+    );
+    // no thumbnail yet: the backend points at the original image
+    const location = res.headers.get('location');
+    if (res.status >= 300 && res.status < 400 && location) {
+      return new Response(null, { status: 302, headers: { Location: location } });
+    }
+    if (!res.ok || !res.body) return new Response(null, { status: res.status });
+    return new Response(res.body, {
+      headers: {
+        'Content-Type': res.headers.get('content-type') ?? 'image/webp',
+        'Cache-Control': res.headers.get('cache-control') ?? 'public, max-age=86400',
+      },
+    });
+  } catch {
+    return new Response(null, { status: 502 });
+  }
+}
@@ -3,11 +3,19 @@ import { useEffect, useState } from 'react';
 import { useMiniKit } from '@coinbase/onchainkit/minikit';
 import BubbleChart from '@/components/BubbleChart';
 
+type FloorChange = {
+  slug: string;
+  floorEth: number;
+  change24hPct: number | null;
+};
+
 type Coll = {
+  slug?: string;
   name: string;
   floorEth: number;
-  change24hPct: number;
+  change24hPct: number | null;
   image: string;
+  imageKey?: string;
   link?: string;
 };
 
@@ -17,10 +25,27 @@ export default function Page() {
   const [range, setRange] = useState<'day' | 'week' | 'month'>('day');
   useEffect(() => { if (!isFrameReady) setFrameReady(); }, [isFrameReady, setFrameReady]);
   useEffect(() => {
-    fetch('/api/collections')
-      .then(res => res.json())
-      .then(setData)
-      .catch(() => setData([]));
+    const load = () =>
+      fetch('/api/collections')
+        .then(res => res.json())
+        .then(setData)
+        .catch(() => setData([]));
+    load();
+
+    // floor changes are pushed by the backend; apply them instead of re-polling the whole list
+    const events = new EventSource('/api/floors/stream');
+    events.addEventListener('floor', (e) => {
+      const { changes } = JSON.parse((e as MessageEvent).data) as { changes: FloorChange[] };
+      const bySlug = new Map(changes.map(c => [c.slug, c]));
+      setData(prev => prev.map(item => {
+        const c = item.slug ? bySlug.get(item.slug) : undefined;
+        if (!c) return item;
+        return { ...item, floorEth: c.floorEth, change24hPct: c.change24hPct };
+      }));
+    });
+    // we fell behind the stream: reload the full list
+    events.addEventListener('resync', load);
+    return () => events.close();
   }, [range]);
 
   const headingLabel = range === 'day' ? '24h' : range === 'week' ? '7d' : '30d';
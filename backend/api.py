@@ -14,26 +14,56 @@ Security / notes:
  - OPENSEA_API_KEY should be set in environment (you already have dotenv in your module).
  - The endpoints return JSON and may save CSV files into the current working directory.
 """
-from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, HTTPException, Query, Body
+from typing import List, Dict, Any, Optional, Literal
+from fastapi import FastAPI, HTTPException, Query, Body, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, StreamingResponse, Response, JSONResponse, RedirectResponse
+from pydantic import BaseModel, Field
 import os
+import json
+import time
+from http import HTTPStatus
 import uvicorn
 import asyncio
+import requests
 from scheduler import scheduler_loop
+from leases import LeaseStore, RateShare
+from rate_limiter import upstream_limiter, API_RATE_WEIGHT
+from stats_cache import stats_cache
+from floor_store import get_floor_store, to_iso
+from snapshot import snapshot, FILTERED_CSV_PATH
+from jobs import Job, job_manager
+from stats_table import cached_stats_table
+import metrics
+import resilience
+from models import CollectionInfo, SLIM, collection_dict, stats_dict
+from events import FloorFeed, floor_events, SSE_MEDIA_TYPE
+from journal import journal
+from export import MEDIA_TYPES, infer_format
+from image_cache import image_cache, THUMB_SIZES, CACHE_CONTROL, MEDIA_TYPE as IMAGE_MEDIA_TYPE
 
 # Adjust this import name to the filename where your original functions live.
 # Example: if your original script is saved as `opensea_tools.py`, leave as-is.
 # If it's called `main.py`, change import accordingly.
 try:
     from opensea_tools import (
-        get_api_key,
-        make_session,
+        get_shared_session,
+        close_shared_session,
         fetch_collections,
+        iter_collection_pages,
+        prefetch_iter,
         fetch_collection_stats,
-        build_filtered_collections,
+        iter_stats_as_completed,
+        MAX_IN_FLIGHT,
+        MERGED_MAX_TOTAL,
+        ORDER_BY_STATS,
+        parse_chains,
+        STATS_OK,
+        STATS_UNAVAILABLE,
+        STATS_TIMEOUT,
+        get_collection_slug,
+        iter_filtered_collections,
+        save_filtered_collections,
         save_filtered_collections_csv,
     )
 except Exception as e:
@@ -54,6 +84,29 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # label by route template (/collections/{collection_slug}/stats), not the raw path
+        route = request.scope.get("route")
+        metrics.http_request_seconds.observe(time.perf_counter() - started, method=request.method,
+                                             route=getattr(route, "path", "unmatched"), status=str(status))
+
+
+@app.middleware("http")
+async def apply_request_deadline(request: Request, call_next):
+    """Give upstream calls made for this request the budget in X-Request-Timeout (or API_REQUEST_TIMEOUT)."""
+    seconds = resilience.parse_timeout_header(request.headers.get(resilience.DEADLINE_HEADER))
+    with resilience.deadline_scope(seconds or resilience.API_REQUEST_TIMEOUT):
+        return await call_next(request)
+
+
 class FilterRequest(BaseModel):
     # If `collections` is not provided, the server will fetch collections using fetch_collections().
     collections: Optional[List[Dict[str, Any]]] = None
@@ -68,12 +121,62 @@ class FilterRequest(BaseModel):
     vol_thresh: Optional[float] = 0.001
     mcap_thresh: Optional[float] = 0.001
     max_results: Optional[int] = 100
+    # number of stats requests kept in flight at once
+    max_in_flight: Optional[int] = Field(8, ge=1, le=MAX_IN_FLIGHT)
+    # "slim" returns only the stats fields models.CollectionStats keeps
+    format: Optional[Literal["full", "slim"]] = "full"
+
+
+class CachedFilterRequest(BaseModel):
+    # same threshold rule as /filter, applied to every cached slug
+    interval: Optional[str] = "7d"
+    vol_thresh: Optional[float] = 0.001
+    mcap_thresh: Optional[float] = 0.001
+    # extra predicates as [column, operator, value], e.g. ["total_market_cap", ">=", 10]
+    where: Optional[List[List[Any]]] = None
+    # rank by a column (e.g. "seven_day_volume_change") and keep the top max_results
+    sort_by: Optional[str] = None
+    descending: Optional[bool] = True
+    max_results: Optional[int] = 100
+    format: Optional[Literal["full", "slim"]] = "full"
+
+
+class BatchStatsRequest(BaseModel):
+    slugs: List[str]
+    # seconds; slugs not done by then come back with status 504 instead of holding up the response
+    deadline: Optional[float] = None
+    max_in_flight: Optional[int] = Field(8, ge=1, le=MAX_IN_FLIGHT)
+    format: Optional[Literal["full", "slim"]] = "full"
+
+
+# slugs accepted by one /collections/stats:batch call
+BATCH_STATS_MAX_SLUGS = int(os.getenv("BATCH_STATS_MAX_SLUGS", "500"))
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def wants_ndjson(request: Request, stream: bool) -> bool:
+    """Streaming is opt-in: `?stream=true` or an `Accept: application/x-ndjson` header."""
+    return stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_line(record: Any) -> bytes:
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def check_merged_total(chain: str, order_by: str, max_total: int) -> None:
+    """400 for a multi-chain crawl ranked by stats beyond MERGED_MAX_TOTAL (ranking costs a stats call per item)."""
+    if len(parse_chains(chain)) > 1 and order_by in ORDER_BY_STATS and max_total > MERGED_MAX_TOTAL:
+        raise HTTPException(status_code=400,
+                            detail=f"max_total is limited to {MERGED_MAX_TOTAL} when several chains are ranked by {order_by}")
 
 
 class SaveCsvRequest(BaseModel):
     all_collections: List[Dict[str, Any]]
     filtered_collections: Dict[str, Dict[str, Any]]
     filename: Optional[str] = "filtered_collections.csv"
+    # csv, ndjson or parquet (needs pyarrow); defaults to the one matching the filename extension
+    format: Optional[Literal["csv", "ndjson", "parquet"]] = None
 
 
 @app.get("/health")
@@ -81,105 +184,396 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/rate_limit")
+def rate_limit_status():
+    """Current state of the shared upstream rate limiter (configured and observed rate, waiters, penalties)."""
+    return upstream_limiter.stats()
+
+
+@app.get("/upstream")
+def upstream_status():
+    """Hedging, deadline and circuit breaker state of the upstream OpenSea calls, per endpoint type."""
+    return resilience.upstream.stats()
+
+
+@app.get("/cache/stats")
+def cache_status():
+    """Hit/miss counters and size of the per-slug stats cache."""
+    return stats_cache.stats()
+
+
+@app.get("/cache/images")
+def image_cache_status():
+    """Size and counters of the thumbnail cache."""
+    return image_cache.stats()
+
+
+@app.get("/images/{key}")
+def api_image(key: str, size: int = Query(THUMB_SIZES[0], ge=1, le=2048)):
+    """Collection thumbnail (square WebP) by the `imageKey` from /snapshot.
+
+    Served with a one-year immutable Cache-Control; `size` picks the smallest cached size covering it.
+    Without a cached or buildable thumbnail, redirects to the original image when its URL is known.
+    """
+    path = image_cache.get(key, size)
+    if path is not None:
+        return FileResponse(path, media_type=IMAGE_MEDIA_TYPE, headers={"Cache-Control": CACHE_CONTROL})
+    url = image_cache.source_url(key)
+    if url and url.startswith(("http://", "https://")):
+        return RedirectResponse(url, status_code=302)
+    raise HTTPException(status_code=404, detail="Image not found")
+
+
+@app.get("/metrics")
+def api_metrics():
+    """Prometheus text format: request and upstream latency, 429s and backoff, stage timings, cache hit rates."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/events/floors")
+async def api_floor_events():
+    """
+    Server-sent events: a `floor` event ({seq, at, changes: [{slug, floorEth, prevFloorEth, change24hPct, ts}]})
+    whenever scheduler refreshes move floors by more than FLOOR_EVENT_EPSILON, and a `resync` event
+    if this client fell behind (reload /snapshot). Load /snapshot once, then apply these deltas.
+    """
+    sub = floor_events.subscribe()
+    return StreamingResponse(floor_events.stream(sub), media_type=SSE_MEDIA_TYPE,
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/events/stats")
+def api_floor_events_stats():
+    return floor_events.stats()
+
+
+@app.get("/journal")
+def journal_status():
+    """What the on-disk response journal holds (keys per kind, index size) and replay counters."""
+    return journal.stats()
+
+
+@app.get("/snapshot")
+def api_snapshot(request: Request):
+    """Chart-ready collection list (name, image, floorEth, change24hPct, link).
+
+    Pre-serialized after each pipeline run / scheduler cycle; supports conditional GET via ETag / If-None-Match.
+    """
+    snap = snapshot.get()
+    headers = {"ETag": snap.etag, "Cache-Control": "no-cache"}
+    if snap.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=snap.body, media_type="application/json", headers=headers)
+
+
 @app.get("/collections")
 def api_fetch_collections(
+        request: Request,
         chain: str = Query("base"),
         order_by: str = Query("market_cap"),
         page_limit: int = Query(100, ge=1, le=500),
         max_total: int = Query(100, ge=1, le=5000),
+        stream: bool = Query(False),
+        format: Literal["full", "slim"] = Query("full"),
 ):
     """Fetch collections (wraps fetch_collections).
 
-    Returns list of collections as JSON.
+    Returns list of collections as JSON, or one collection per NDJSON line when streaming
+    (`?stream=true` or `Accept: application/x-ndjson`), sent as each page arrives.
+    `chain` may be a comma-separated list (`base,ethereum`): the chains are crawled concurrently and
+    merged into one ranking by `order_by` (streaming then starts once the merge is done); ranking by a
+    stats field costs a stats call per collection, so `max_total` is capped at MERGED_MAX_TOTAL there.
+    `?format=slim` keeps only slug, name, image, link and category per collection.
     """
+    slim = format == SLIM
+    check_merged_total(chain, order_by, max_total)
     try:
-        api_key = get_api_key()
-        session = make_session(api_key)
+        session = get_shared_session()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create session: {e}")
 
+    if wants_ndjson(request, stream):
+        def generate():
+            try:
+                for page in iter_collection_pages(session, chain=chain, order_by=order_by, page_limit=page_limit, max_total=max_total):
+                    for collection in page:
+                        yield ndjson_line(collection_dict(collection, slim))
+            except Exception as e:
+                # headers are already sent; report the failure as the last record
+                yield ndjson_line({"error": str(e)})
+
+        return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
+
     try:
         cols = fetch_collections(session, chain=chain, order_by=order_by, page_limit=page_limit, max_total=max_total)
-        return {"count": len(cols), "collections": cols}
+        return {"count": len(cols), "collections": [collection_dict(c, slim) for c in cols]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/collections/{collection_slug}/stats")
-def api_collection_stats(collection_slug: str):
+def api_collection_stats(collection_slug: str, format: Literal["full", "slim"] = Query("full")):
     """Fetch stats for a specific collection slug.
 
-    Returns the raw stats JSON or 404 if not found.
+    Returns the raw stats JSON (or its slim form with `?format=slim`) or 404 if not found;
+    503 while the upstream circuit breaker is open with nothing cached, 504 if the request deadline ran out.
     """
     try:
-        api_key = get_api_key()
-        session = make_session(api_key)
+        session = get_shared_session()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create session: {e}")
 
-    stats = fetch_collection_stats(session, collection_slug)
+    errors: Dict[str, int] = {}
+    stats = fetch_collection_stats(session, collection_slug, errors=errors)
     if stats is None:
+        status = errors.get(collection_slug)
+        if status in (STATS_UNAVAILABLE, STATS_TIMEOUT):
+            raise HTTPException(status_code=status, detail=f"Stats for {collection_slug}: {HTTPStatus(status).phrase}")
         raise HTTPException(status_code=404, detail=f"Stats not available for {collection_slug}")
-    return stats
+    return stats_dict(stats, format == SLIM)
 
 
-@app.post("/filter")
-def api_filter_collections(payload: FilterRequest = Body(...)):
-    """Build filtered collections. If `collections` not provided, the server fetches collections first.
+def batch_stats_record(slug: str, status: int, stats: Optional[Dict[str, Any]], slim: bool) -> Dict[str, Any]:
+    if status == STATS_OK:
+        return {"slug": slug, "status": status, "stats": stats_dict(stats, slim)}
+    try:
+        error = HTTPStatus(status).phrase
+    except ValueError:
+        error = "Upstream error"
+    return {"slug": slug, "status": status, "error": error}
 
-    Returns mapping slug -> stats (the same format build_filtered_collections returns).
+
+@app.post("/collections/stats:batch")
+def api_collection_stats_batch(request: Request, payload: BatchStatsRequest = Body(...), stream: bool = Query(False)):
+    """Fetch stats for many slugs at once, concurrently and under the shared rate limit.
+
+    Every slug gets its own `status` (200, 404, 429, 502, or 504 when `deadline` seconds passed first),
+    so failures never fail the batch. Returns the results in request order, or one NDJSON line per slug
+    in completion order when streaming (`?stream=true` or `Accept: application/x-ndjson`).
+    Fresh cached stats are answered without an upstream call.
     """
+    slugs = [slug for slug in dict.fromkeys(s.strip() for s in payload.slugs) if slug]
+    if len(slugs) > BATCH_STATS_MAX_SLUGS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_STATS_MAX_SLUGS} slugs per batch")
+    if payload.deadline is not None and payload.deadline <= 0:
+        raise HTTPException(status_code=400, detail="deadline must be positive")
     try:
-        api_key = get_api_key()
-        session = make_session(api_key)
+        session = get_shared_session()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create session: {e}")
 
-    collections = payload.collections
-    if collections is None:
-        # fetch collections using provided fetch params
-        try:
-            collections = fetch_collections(
-                session,
-                chain=payload.chain or "base",
-                order_by=payload.order_by or "market_cap",
-                page_limit=payload.page_limit or 100,
-                max_total=payload.max_total or 100,
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to fetch collections: {e}")
+    slim = payload.format == SLIM
+    results = iter_stats_as_completed(session, slugs, max_in_flight=payload.max_in_flight or 8,
+                                      timeout=payload.deadline)
+
+    if wants_ndjson(request, stream):
+        def generate():
+            try:
+                for slug, status, stats in results:
+                    yield ndjson_line(batch_stats_record(slug, status, stats, slim))
+            except Exception as e:
+                yield ndjson_line({"error": str(e)})
+
+        return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
+
+    started = time.perf_counter()
+    by_slug = {slug: (status, stats) for slug, status, stats in results}
+    statuses = [status for status, _ in by_slug.values()]
+    return {
+        "count": len(slugs),
+        "ok": statuses.count(STATS_OK),
+        "failed": len(statuses) - statuses.count(STATS_OK) - statuses.count(STATS_TIMEOUT),
+        "timed_out": statuses.count(STATS_TIMEOUT),
+        "elapsed": round(time.perf_counter() - started, 3),
+        "results": [batch_stats_record(slug, *by_slug[slug], slim) for slug in slugs],
+    }
+
+
+@app.get("/collections/{collection_slug}/history")
+def api_collection_history(
+        collection_slug: str,
+        from_: Optional[str] = Query(None, alias="from"),
+        to: Optional[str] = Query(None),
+        limit: Optional[int] = Query(None, ge=1, le=100000),
+):
+    """Floor price history recorded by the scheduler.
 
+    `from` / `to` accept epoch seconds or ISO-8601 timestamps (UTC); both are inclusive and optional.
+    """
     try:
-        filtered = build_filtered_collections(
+        points = get_floor_store().history(collection_slug, start=from_, end=to, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid time range: {e}")
+    return {
+        "slug": collection_slug,
+        "count": len(points),
+        "points": [{"timestamp": to_iso(ts), "floor_price": floor} for ts, floor in points],
+    }
+
+
+@app.get("/collections/{collection_slug}/ohlc")
+def api_collection_ohlc(
+        collection_slug: str,
+        resolution: Literal["1h", "1d", "1w"] = Query("1h"),
+        from_: Optional[str] = Query(None, alias="from"),
+        to: Optional[str] = Query(None),
+        limit: int = Query(1000, ge=1, le=10000),
+):
+    """Floor price candles from the scheduler's rollups: one point per `resolution` bucket, oldest first.
+
+    `from` / `to` work as for /history; without `from`, the newest `limit` buckets are returned.
+    """
+    try:
+        candles = get_floor_store().ohlc(collection_slug, resolution, start=from_, end=to, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid time range: {e}")
+    return {
+        "slug": collection_slug,
+        "resolution": resolution,
+        "count": len(candles),
+        "points": [{"timestamp": to_iso(bucket), "open": o, "high": h, "low": l, "close": c, "count": n}
+                   for bucket, o, h, l, c, n in candles],
+    }
+
+
+def collections_source(session, payload: FilterRequest, job: Optional[Job] = None):
+    """Collections given in the payload, or a stream of crawled pages (next page prefetched while filtering)."""
+    if payload.collections is not None:
+        collections = payload.collections
+    else:
+        pages = prefetch_iter(iter_collection_pages(
+            session,
+            chain=payload.chain or "base",
+            order_by=payload.order_by or "market_cap",
+            page_limit=payload.page_limit or 100,
+            max_total=payload.max_total or 100,
+        ))
+        collections = (c for page in count_pages(pages, job) for c in page)
+    return job.cancellable(collections) if job else collections
+
+
+def count_pages(pages, job: Optional[Job]):
+    """Count fetched pages on the job. A request error ends the crawl, keeping the pages already fetched."""
+    fetched = 0
+    try:
+        for page in pages:
+            fetched += 1
+            if job:
+                job.progress["pages_fetched"] = job.progress.get("pages_fetched", 0) + 1
+            yield page
+    except requests.RequestException as e:
+        print(f"Collections crawl stopped after {fetched} pages: {e}")
+
+
+def filter_work(session, payload: FilterRequest, job: Optional[Job] = None) -> Dict[str, Any]:
+    filtered: Dict[str, Dict[str, Any]] = {}
+    progress = job.progress if job else None
+    slim = payload.format == SLIM
+    for slug, stats in iter_filtered_collections(
             session,
-            collections,
+            collections_source(session, payload, job),
             interval=payload.interval or "7d",
             vol_thresh=payload.vol_thresh or 0.001,
             mcap_thresh=payload.mcap_thresh or 0.001,
             max_results=payload.max_results or 100,
-        )
+            max_in_flight=payload.max_in_flight or 8,
+            progress=progress,
+    ):
+        filtered[slug] = stats_dict(stats, slim)
+        if job:
+            # publish a copy so readers never see the dict while it is being extended
+            job.result = {"count": len(filtered), "filtered": dict(filtered)}
+    return {"count": len(filtered), "filtered": filtered}
+
+
+@app.post("/filter")
+def api_filter_collections(request: Request, payload: FilterRequest = Body(...), stream: bool = Query(False),
+                           background: bool = Query(False)):
+    """Build filtered collections. If `collections` not provided, the server fetches collections first.
+
+    Returns mapping slug -> stats (the same format build_filtered_collections returns).
+    When streaming (`?stream=true` or `Accept: application/x-ndjson`), each accepted collection is sent
+    as a `{"slug": ..., "stats": ...}` NDJSON line as soon as it passes the thresholds.
+    With `?background=true` the work runs as a job: the response is 202 with a job id to poll at /jobs/{id}.
+    """
+    if payload.collections is None:
+        check_merged_total(payload.chain or "base", payload.order_by or "market_cap", payload.max_total or 100)
+    try:
+        session = get_shared_session()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to create session: {e}")
+
+    if background:
+        job, created = job_manager.submit("filter", payload.dict(), lambda job: filter_work(session, payload, job))
+        return JSONResponse(status_code=202, content={**job.to_dict(include_result=False), "created": created})
+
+    if wants_ndjson(request, stream):
+        def generate():
+            try:
+                for slug, stats in iter_filtered_collections(
+                        session,
+                        collections_source(session, payload),
+                        interval=payload.interval or "7d",
+                        vol_thresh=payload.vol_thresh or 0.001,
+                        mcap_thresh=payload.mcap_thresh or 0.001,
+                        max_results=payload.max_results or 100,
+                        max_in_flight=payload.max_in_flight or 8,
+                ):
+                    yield ndjson_line({"slug": slug, "stats": stats_dict(stats, payload.format == SLIM)})
+            except Exception as e:
+                yield ndjson_line({"error": str(e)})
+
+        return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
+
+    try:
+        return filter_work(session, payload)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Filtering failed: {e}")
 
-    return {"count": len(filtered), "filtered": filtered}
+
+@app.post("/filter/cached")
+def api_filter_cached(payload: CachedFilterRequest = Body(...)):
+    """Re-filter and rank stats already in the cache with vectorized predicates; makes no upstream calls.
+
+    Returns {"count", "filtered": slug -> stats} in ranking order (cache order when sort_by is not given).
+    `"format": "slim"` returns only the stats fields models.CollectionStats keeps.
+    """
+    table = cached_stats_table()
+    try:
+        mask = table.threshold_mask(payload.interval or "7d", payload.vol_thresh or 0.001, payload.mcap_thresh or 0.001)
+        if payload.where:
+            mask &= table.mask([(str(c), str(op), float(v)) for c, op, v in payload.where])
+        order = table.rank(mask, sort_by=payload.sort_by, k=payload.max_results or 100,
+                           descending=payload.descending is not False)
+        slugs = list(table.slugs[order])
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filtered: Dict[str, Any] = {}
+    for slug in slugs:
+        entry = stats_cache.peek(slug)
+        if entry is not None:
+            filtered[slug] = stats_dict(entry[0], payload.format == SLIM)
+    return {"count": len(filtered), "cached": len(table), "filtered": filtered}
 
 
 @app.post("/save_csv")
 def api_save_csv(payload: SaveCsvRequest = Body(...)):
-    """Save filtered collections to CSV using your existing save_filtered_collections_csv.
+    """Save filtered collections to CSV (or NDJSON / Parquet) using save_filtered_collections.
 
-    Returns {"ok": True, "filename": "..."} and the file will be written to the server cwd.
+    Returns {"ok": True, "filename": "...", "rows": n} and the file will be written to the server cwd.
     """
     filename = payload.filename or "filtered_collections.csv"
     try:
-        save_filtered_collections_csv(payload.all_collections, payload.filtered_collections, filename=filename)
+        rows = save_filtered_collections(payload.all_collections, payload.filtered_collections, filename=filename,
+                                         fmt=payload.format)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save CSV: {e}")
 
-    if not os.path.exists(filename):
+    if rows is None or not os.path.exists(filename):
         raise HTTPException(status_code=500, detail=f"CSV was not created: {filename}")
 
-    return {"ok": True, "filename": filename}
+    return {"ok": True, "filename": filename, "rows": rows}
 
 
 @app.get("/download/{filename}")
@@ -194,7 +588,45 @@ def download_file(filename: str):
         raise HTTPException(status_code=403, detail="Access forbidden")
     if not os.path.exists(safe_path):
         raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(safe_path, media_type='text/csv', filename=os.path.basename(safe_path))
+    return FileResponse(safe_path, media_type=MEDIA_TYPES[infer_format(safe_path)], filename=os.path.basename(safe_path))
+
+
+def pipeline_work(session, interval: str, vol_thresh: float, mcap_thresh: float, max_results: int,
+                  filename: str, max_in_flight: int, slim: bool = False, chain: str = "base",
+                  job: Optional[Job] = None) -> Dict[str, Any]:
+    # filter each page as soon as it arrives while the next one loads in the background
+    # slim: keep parsed CollectionInfo models instead of the raw page dicts, and write a slim CSV
+    all_collections: List[Any] = []
+    pages = count_pages(prefetch_iter(iter_collection_pages(session, chain=chain, order_by="market_cap", page_limit=100, max_total=100)), job)
+
+    def stream_collections():
+        for page in pages:
+            all_collections.extend([CollectionInfo.from_api(c) for c in page] if slim else page)
+            yield from page
+
+    collections_iter = stream_collections()
+    source = job.cancellable(collections_iter) if job else collections_iter
+    filtered: Dict[str, Dict[str, Any]] = {}
+    for slug, stats in iter_filtered_collections(session, source, interval=interval, vol_thresh=vol_thresh, mcap_thresh=mcap_thresh,
+                                                 max_results=max_results, max_in_flight=max_in_flight,
+                                                 progress=job.progress if job else None):
+        filtered[slug] = stats
+        if job:
+            # partial result while the pipeline runs; a copy, so readers never see the dict while it is being extended
+            job.result = {"count_all": len(all_collections), "count_filtered": len(filtered),
+                          "filtered": {s: stats_dict(v, slim) for s, v in filtered.items()}}
+    # finish the crawl so the saved CSV and count_all cover every fetched collection
+    for _ in source:
+        pass
+    if job:
+        job.check_cancelled()
+    save_filtered_collections_csv(all_collections, filtered, filename=filename, slim=slim)
+
+    by_slug = {get_collection_slug(c): c for c in all_collections}
+    snapshot.set_collections((collection_dict(by_slug[slug]), stats) for slug, stats in filtered.items() if slug in by_slug)
+    snapshot.rebuild()
+    image_cache.prefetch(snapshot.image_urls())
+    return {"ok": True, "count_all": len(all_collections), "count_filtered": len(filtered), "filename": filename}
 
 
 # Optional: a convenience endpoint to run the full main() pipeline once (fetch -> filter -> save)
@@ -205,30 +637,100 @@ def run_pipeline(
         mcap_thresh: float = Body(0.001),
         max_results: int = Body(10),
         filename: str = Body("filtered_collections.csv"),
+        max_in_flight: int = Body(8, ge=1, le=MAX_IN_FLIGHT),
+        slim: bool = Body(False),
+        chain: str = Body("base"),
+        background: bool = Query(False),
 ):
     """Run the typical pipeline: fetch collections, filter, save CSV.
 
     This is a convenience wrapper around your main() logic.
+    With `?background=true` it runs as a job (202 + job id, poll /jobs/{id}).
+    `slim: true` writes only the fields the chart reads to the CSV (see models.py).
+    `chain` may list several chains ("base,ethereum"), crawled concurrently and ranked together by market cap.
     """
     try:
-        api_key = get_api_key()
-        session = make_session(api_key)
+        session = get_shared_session()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create session: {e}")
 
+    params = {"interval": interval, "vol_thresh": vol_thresh, "mcap_thresh": mcap_thresh,
+              "max_results": max_results, "filename": filename, "max_in_flight": max_in_flight, "slim": slim,
+              "chain": chain}
+    if background:
+        job, created = job_manager.submit("run_pipeline", params, lambda job: pipeline_work(session, job=job, **params))
+        return JSONResponse(status_code=202, content={**job.to_dict(include_result=False), "created": created})
+
     try:
-        all_collections = fetch_collections(session, chain="base", order_by="market_cap", page_limit=100, max_total=100)
-        filtered = build_filtered_collections(session, all_collections, interval=interval, vol_thresh=vol_thresh, mcap_thresh=mcap_thresh, max_results=max_results)
-        save_filtered_collections_csv(all_collections, filtered, filename=filename)
+        return pipeline_work(session, **params)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Pipeline failed: {e}")
 
-    return {"ok": True, "count_all": len(all_collections), "count_filtered": len(filtered), "filename": filename}
+
+@app.get("/jobs")
+def api_list_jobs():
+    """All known jobs (without results)."""
+    return {"jobs": [job.to_dict(include_result=False) for job in job_manager.list_jobs()]}
+
+
+@app.get("/jobs/{job_id}")
+def api_get_job(job_id: str):
+    """Status, progress counters and the (partial) result of a background job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.to_dict()
+
+
+@app.delete("/jobs/{job_id}")
+def api_cancel_job(job_id: str):
+    """Cancel a pending or running job. Returns its state after the request."""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.to_dict(include_result=False)
 
 @app.on_event("startup")
 async def start_scheduler_task():
-    task = asyncio.create_task(scheduler_loop(interval_seconds=3600, slugs=None, limit_slugs=100))
+    # this process's slice of the upstream quota, shared with other API and scheduler worker processes
+    app.state.rate_share = RateShare(upstream_limiter, API_RATE_WEIGHT).start()
+    # one pooled session for the whole process; handlers and the scheduler share its connections
+    session = get_shared_session()
+    # warm start: stats from the response journal, with their original fetch times
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, journal.warm_stats_cache, stats_cache)
+        loop.run_in_executor(None, journal.compact_if_needed)
+    except Exception as e:
+        print(f"Failed to warm stats cache from journal: {e}")
+    if os.path.exists(FILTERED_CSV_PATH):
+        try:
+            snapshot.load_csv(FILTERED_CSV_PATH)
+            snapshot.rebuild()
+            image_cache.prefetch(snapshot.image_urls())
+        except Exception as e:
+            print(f"Failed to build snapshot from {FILTERED_CSV_PATH}: {e}")
+    app.state.floor_feed_task = asyncio.create_task(FloorFeed(floor_events, snapshot_holder=snapshot).run())
+    # EMBEDDED_SCHEDULER=0 when the scheduler runs as separate processes (scheduler_worker.py)
+    if os.getenv("EMBEDDED_SCHEDULER", "1") == "0":
+        return
+    # leases split the slug set when several uvicorn workers each start a scheduler
+    task = asyncio.create_task(scheduler_loop(interval_seconds=3600, slugs=None, limit_slugs=100, session=session,
+                                              lease_store=LeaseStore()))
     app.state.scheduler_task = task
 
+
+@app.on_event("shutdown")
+async def stop_scheduler_task():
+    for name in ("scheduler_task", "floor_feed_task"):
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
+    job_manager.shutdown()
+    close_shared_session()
+    rate_share = getattr(app.state, "rate_share", None)
+    if rate_share is not None:
+        rate_share.stop()
+
 if __name__ == "__main__":
     uvicorn.run("api:app", host="127.0.0.1", port=8000, reload=True)
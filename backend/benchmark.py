@@ -0,0 +1,205 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (c) 2025 Danila Novik & Heorhi Shtsivel
+
+"""
+Offline benchmark of the data pipeline against the local mock API (mock_opensea.py).
+
+For each pipeline size it runs the stages the API and scheduler run, in order:
+  crawl      fetch_collections (cursor pagination; all --chains concurrently, merged by market cap)
+  filter     build_filtered_collections (concurrent stats fan-out, cold stats cache)
+  save_csv   save_filtered_collections_csv
+  scheduler  one scheduler cycle: every slug refreshed in batches, written to a throwaway floor store
+and reports wall time, throughput, upstream request latency (p50/p99, measured by the client)
+and peak traced memory per stage. No network access is needed.
+
+Run:
+    python benchmark.py --sizes 100,1000,10000 --latency 0.02 --rate-429 0.01 --json bench.json
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import opensea_tools
+from floor_store import FloorStore
+from journal import journal
+from mock_opensea import MockOpenSea, make_dataset, SEED_CSV_PATH
+from opensea_tools import (make_session, fetch_collections, build_filtered_collections,
+                           save_filtered_collections_csv, get_collection_slug)
+from rate_limiter import upstream_limiter
+from scheduler import fetch_floor_for_slugs
+from stats_cache import stats_cache
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100); None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class RequestRecorder:
+    """requests response hook collecting per-request latency and status."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.rate_limited = 0
+
+    def __call__(self, resp, *args, **kwargs):
+        with self._lock:
+            self.latencies.append(resp.elapsed.total_seconds())
+            if resp.status_code == 429:
+                self.rate_limited += 1
+        return resp
+
+    def reset(self) -> None:
+        with self._lock:
+            self.latencies = []
+            self.rate_limited = 0
+
+
+def run_stage(name: str, items: int, recorder: RequestRecorder, fn: Callable[[], Any],
+              trace_memory: bool) -> Dict[str, Any]:
+    recorder.reset()
+    if trace_memory:
+        tracemalloc.reset_peak()
+    # the pipeline logs every accepted collection; keep that out of the report and the timing
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    latencies = list(recorder.latencies)
+    return {
+        "stage": name,
+        "items": items,
+        "seconds": elapsed,
+        "items_per_sec": items / elapsed if elapsed > 0 else None,
+        "requests": len(latencies),
+        "rate_limited": recorder.rate_limited,
+        "p50_ms": None if not latencies else percentile(latencies, 50) * 1000,
+        "p99_ms": None if not latencies else percentile(latencies, 99) * 1000,
+        "peak_mem_mb": None if peak is None else peak / 1e6,
+        "result": result,
+    }
+
+
+def run_size(size: int, args: argparse.Namespace, workdir: str) -> List[Dict[str, Any]]:
+    chains = [c for c in args.chains.split(",") if c.strip()]
+    collections, stats = make_dataset(size, args.seed_csv, chains=chains)
+    mock = MockOpenSea(collections, stats, latency=args.latency, jitter=args.jitter,
+                       rate_429=args.rate_429, retry_after=args.retry_after)
+    recorder = RequestRecorder()
+    session = make_session("benchmark", pool_size=args.max_in_flight)
+    session.hooks["response"].append(recorder)
+    opensea_tools.API_BASE = mock.url
+    stats_cache.clear()
+    trace = not args.no_memory
+
+    results = []
+    with mock:
+        crawl = run_stage("crawl", size, recorder, lambda: fetch_collections(
+            session, chain=",".join(chains), page_limit=args.page_limit, max_total=size, pause=args.pause), trace)
+        all_collections = crawl.pop("result")
+        results.append(crawl)
+
+        # a multi-chain crawl ranks by stats, which warms the cache; the filter stage is measured cold
+        stats_cache.clear()
+        filt = run_stage("filter", len(all_collections), recorder, lambda: build_filtered_collections(
+            session, all_collections, interval="7d", vol_thresh=0.0, mcap_thresh=0.0,
+            max_results=len(all_collections), max_in_flight=args.max_in_flight), trace)
+        filtered = filt.pop("result")
+        results.append(filt)
+
+        csv_path = os.path.join(workdir, f"filtered_{size}.csv")
+        save = run_stage("save_csv", len(filtered), recorder,
+                         lambda: save_filtered_collections_csv(all_collections, filtered, csv_path), trace)
+        save.pop("result")
+        results.append(save)
+
+        slugs = [slug for slug in (get_collection_slug(c) for c in all_collections) if slug]
+        store = FloorStore(os.path.join(workdir, f"floors_{size}.db"))
+
+        def scheduler_cycle():
+            written = 0
+            # same batching as scheduler_loop: fetch a batch, write it in one transaction
+            for i in range(0, len(slugs), args.batch_size):
+                rows = fetch_floor_for_slugs(session, slugs[i:i + args.batch_size], max_in_flight=args.max_in_flight)
+                written += store.write_batch(rows)
+            return written
+
+        cycle = run_stage("scheduler", len(slugs), recorder, scheduler_cycle, trace)
+        cycle.pop("result")
+        results.append(cycle)
+
+    session.close()
+    for row in results:
+        row["size"] = size
+    return results
+
+
+def _fmt(value: Optional[float], spec: str) -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    header = f"{'size':>6} {'stage':<10} {'items':>6} {'seconds':>8} {'items/s':>9} {'reqs':>6} " \
+             f"{'429s':>5} {'p50 ms':>7} {'p99 ms':>7} {'peak MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['size']:>6} {r['stage']:<10} {r['items']:>6} {r['seconds']:>8.3f} "
+              f"{_fmt(r['items_per_sec'], '9.1f'):>9} {r['requests']:>6} {r['rate_limited']:>5} "
+              f"{_fmt(r['p50_ms'], '7.1f'):>7} {_fmt(r['p99_ms'], '7.1f'):>7} {_fmt(r['peak_mem_mb'], '8.2f'):>8}")
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against a local mock OpenSea API")
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma-separated collection counts")
+    parser.add_argument("--seed-csv", default=SEED_CSV_PATH)
+    parser.add_argument("--latency", type=float, default=0.02, help="mock mean response delay (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.005, help="mock response delay stddev (seconds)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="share of mock responses that are 429")
+    parser.add_argument("--retry-after", type=float, default=0.05, help="Retry-After sent with mock 429s")
+    parser.add_argument("--rate", type=float, default=1000.0,
+                        help="client rate limit (req/s); high by default so the code, not the limiter, is measured")
+    parser.add_argument("--chains", default="base",
+                        help="comma-separated chains; collections are spread over them and crawled concurrently")
+    parser.add_argument("--pause", type=float, default=0.0, help="pause between collection pages (seconds)")
+    parser.add_argument("--page-limit", type=int, default=100)
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=10, help="scheduler batch size")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (it slows Python code down)")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    # the benchmark measures the pipeline, not journal writes, and must not fill the real journal
+    journal.enabled = False
+    upstream_limiter.rate = args.rate
+    upstream_limiter.capacity = args.rate
+    if not args.no_memory:
+        tracemalloc.start()
+
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory(prefix="nft-bench-") as workdir:
+        for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+            results.extend(run_size(size, args, workdir))
+
+    print_report(results)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as fh:
+            json.dump({"params": vars(args), "results": results}, fh, indent=2)
+        print(f"Wrote {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (c) 2025 Danila Novik & Heorhi Shtsivel
+
+"""
+Server-sent events stream of floor price changes (GET /events/floors).
+
+FloorFeed polls the floor store's change feed (FloorStore.changes_since), so it sees rows from
+the embedded scheduler and from separate scheduler workers alike. Only slugs whose floor moved
+by more than FLOOR_EVENT_EPSILON (relative to the last floor sent) are published. Each batch is
+encoded into one SSE frame once and the same bytes are handed to every subscriber.
+
+Every subscriber has a bounded queue. A client too slow to keep up has its backlog dropped and
+gets a single `resync` event instead, telling it to reload the full snapshot.
+
+The feed also keeps the API process's /snapshot current: when new samples arrive it rebuilds it,
+at most every SNAPSHOT_REBUILD_SECONDS. This works whether the scheduler runs embedded or as
+scheduler_worker.py processes, which have no snapshot of their own to serve.
+"""
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+from floor_store import FloorStore, get_floor_store
+from snapshot import SnapshotHolder, floor_change_24h
+
+# minimum relative floor move (0.001 = 0.1%) that is pushed to clients
+FLOOR_EVENT_EPSILON = float(os.getenv("FLOOR_EVENT_EPSILON", "0.001"))
+# how often the floor store is checked for new samples (seconds)
+FLOOR_EVENT_POLL = float(os.getenv("FLOOR_EVENT_POLL", "2"))
+# frames buffered per client before it is switched to resync
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("FLOOR_EVENT_QUEUE", "32"))
+HEARTBEAT_SECONDS = 15.0
+# minimum time between snapshot rebuilds triggered by new floor samples (seconds)
+SNAPSHOT_REBUILD_SECONDS = float(os.getenv("SNAPSHOT_REBUILD_SECONDS", "60"))
+
+SSE_MEDIA_TYPE = "text/event-stream"
+# tells EventSource to wait 5s before reconnecting
+RETRY_FRAME = b"retry: 5000\n\n"
+HEARTBEAT_FRAME = b": ping\n\n"
+RESYNC_FRAME = b"event: resync\ndata: {}\n\n"
+
+
+def sse_frame(event: str, data: Dict, event_id: Optional[int] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return f"{head}event: {event}\ndata: {body}\n\n".encode("utf-8")
+
+
+class Subscriber:
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self, size: int):
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=size)
+        self.dropped = 0
+
+
+class FloorEventHub:
+    """Fan-out of pre-encoded frames to subscribers; all methods run on the event loop thread."""
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscriber] = set()
+        self.published = 0
+        self.resyncs = 0
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscriber:
+        sub = Subscriber(self.queue_size)
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        self._subscribers.discard(sub)
+
+    def publish(self, frame: bytes) -> None:
+        self.published += 1
+        for sub in self._subscribers:
+            try:
+                sub.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # the client is behind; its backlog is worthless once it reloads, so replace it
+                while not sub.queue.empty():
+                    sub.queue.get_nowait()
+                sub.queue.put_nowait(RESYNC_FRAME)
+                sub.dropped += 1
+                self.resyncs += 1
+
+    async def stream(self, sub: Subscriber) -> AsyncIterator[bytes]:
+        """SSE body for one client; unsubscribes when the client goes away."""
+        try:
+            yield RETRY_FRAME
+            while True:
+                try:
+                    yield await asyncio.wait_for(sub.queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # keeps idle connections open through proxies
+                    yield HEARTBEAT_FRAME
+        finally:
+            self.unsubscribe(sub)
+
+    def stats(self) -> Dict[str, int]:
+        return {"subscribers": len(self._subscribers), "published": self.published, "resyncs": self.resyncs}
+
+
+class FloorFeed:
+    """Turns new floor store samples into `floor` events on a hub."""
+
+    def __init__(self, hub: FloorEventHub, epsilon: float = FLOOR_EVENT_EPSILON,
+                 store: Optional[FloorStore] = None, snapshot_holder: Optional[SnapshotHolder] = None,
+                 snapshot_every: float = SNAPSHOT_REBUILD_SECONDS):
+        self.hub = hub
+        self.epsilon = epsilon
+        self.store = store
+        self.snapshot_holder = snapshot_holder
+        self.snapshot_every = snapshot_every
+        # new samples arrived since the last snapshot rebuild
+        self._snapshot_dirty = False
+        self._last_snapshot = time.monotonic()
+        self.seq = 0
+        # slug -> floor last sent (or seen at startup); deltas are measured against it so slow drift still gets sent
+        self._sent: Dict[str, float] = {}
+
+    def prime(self) -> None:
+        """Start from the current state so a restart does not replay every slug."""
+        store = self.store or get_floor_store()
+        _, self.seq = store.changes_since(0)
+        self._sent = {slug: floor for slug, _, floor in store.latest_all()}
+
+    def collect(self) -> Optional[bytes]:
+        """Read new samples and return one encoded frame with the floors that moved (None if none did)."""
+        store = self.store or get_floor_store()
+        rows, seq = store.changes_since(self.seq)
+        if not rows:
+            return None
+        self.seq = seq
+        self._snapshot_dirty = True
+        changes: List[Dict] = []
+        for slug, ts, floor in rows:
+            prev = self._sent.get(slug)
+            if prev is not None and abs(floor - prev) <= self.epsilon * abs(prev):
+                continue
+            self._sent[slug] = floor
+            _, change = floor_change_24h(store, slug)
+            changes.append({
+                "slug": slug,
+                "floorEth": floor,
+                "prevFloorEth": prev,
+                "change24hPct": round(change, 2) if change is not None else None,
+                "ts": ts,
+            })
+        if not changes:
+            return None
+        return sse_frame("floor", {"seq": seq, "at": int(time.time()), "changes": changes}, event_id=seq)
+
+    def refresh_snapshot(self) -> bool:
+        """Rebuild the snapshot if new samples arrived and the last rebuild is old enough; True if rebuilt."""
+        if self.snapshot_holder is None or not self._snapshot_dirty:
+            return False
+        now = time.monotonic()
+        if now - self._last_snapshot < self.snapshot_every:
+            return False
+        self._snapshot_dirty = False
+        self._last_snapshot = now
+        self.snapshot_holder.rebuild(self.store)
+        return True
+
+    async def run(self, poll_seconds: float = FLOOR_EVENT_POLL) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.prime)
+        while True:
+            try:
+                # runs with no subscribers too, so the cursor and the sent floors stay current
+                frame = await loop.run_in_executor(None, self.collect)
+                if frame is not None and len(self.hub):
+                    self.hub.publish(frame)
+                await loop.run_in_executor(None, self.refresh_snapshot)
+            except Exception as e:
+                print(f"[events] floor feed error: {e}")
+            await asyncio.sleep(poll_seconds)
+
+
+# shared by the API's /events/floors endpoint and its startup feed task
+floor_events = FloorEventHub()
@@ -0,0 +1,175 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (c) 2025 Danila Novik & Heorhi Shtsivel
+
+"""
+Export of filtered collections to CSV, NDJSON or Parquet.
+
+Each filtered slug is matched to its collection through a slug index built once, so the two
+inputs may come in any order and collections may carry their slug under any of the usual keys.
+Rows are streamed to the output as they are produced (Parquet in record batches), so a large
+export holds the index and one batch in memory, not the whole file.
+
+Files are written to a temporary file next to the target and renamed over it once complete,
+so readers (the /api/collections route, /snapshot, /download) see either the previous file or
+the new one, never a half-written one.
+"""
+import csv
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Dict, IO, Iterable, Iterator, Mapping, Optional, Tuple
+
+from models import Collection, collection_slug, collection_dict, stats_dict
+
+CSV, NDJSON, PARQUET = "csv", "ndjson", "parquet"
+FORMATS = (CSV, NDJSON, PARQUET)
+EXTENSIONS = {".csv": CSV, ".ndjson": NDJSON, ".jsonl": NDJSON, ".parquet": PARQUET}
+MEDIA_TYPES = {CSV: "text/csv", NDJSON: "application/x-ndjson", PARQUET: "application/vnd.apache.parquet"}
+
+# read once at import: os.umask() can only be read by setting it, which races with other threads creating files
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# rows per Parquet record batch (and row group)
+PARQUET_BATCH_ROWS = 1000
+
+ExportRow = Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]
+
+
+def infer_format(filename: str) -> str:
+    """Export format from the file extension (CSV for unknown extensions)."""
+    return EXTENSIONS.get(os.path.splitext(filename)[1].lower(), CSV)
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+@contextmanager
+def atomic_open(path: str, mode: str = "w", **kwargs) -> Iterator[IO]:
+    """Open a temp file in the target's directory; it replaces `path` only if the block completes."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        # mkstemp creates the file 0600; give it the permissions a plain open() would
+        os.fchmod(fd, 0o666 & ~_UMASK)
+        with os.fdopen(fd, mode, **kwargs) as fh:
+            yield fh
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _filtered_entries(filtered_collections: Any) -> Iterator[Tuple[Optional[str], Optional[Dict[str, Any]]]]:
+    """(slug, stats) from a slug -> stats mapping, (slug, stats) pairs, slugs, or dicts holding a slug."""
+    if isinstance(filtered_collections, Mapping):
+        yield from filtered_collections.items()
+        return
+    for entry in filtered_collections:
+        if isinstance(entry, str):
+            yield entry, None
+        elif isinstance(entry, tuple) and len(entry) == 2:
+            yield entry
+        elif isinstance(entry, dict):
+            yield collection_slug(entry), entry.get("stats")
+
+
+def iter_export_rows(all_collections: Iterable[Collection], filtered_collections: Any,
+                     slim: bool = False) -> Iterator[ExportRow]:
+    """(slug, general_info, stats) per filtered entry, in the order of `filtered_collections`."""
+    index: Dict[str, Collection] = {}
+    for collection in all_collections:
+        slug = collection_slug(collection)
+        if slug and slug not in index:
+            index[slug] = collection
+    missing = 0
+    for slug, stats in _filtered_entries(filtered_collections):
+        if not slug:
+            continue
+        collection = index.get(slug)
+        if collection is None:
+            missing += 1
+            general_info: Dict[str, Any] = {"collection": slug}
+        else:
+            general_info = collection_dict(collection, slim)
+        yield slug, general_info, stats_dict(stats, slim)
+    if missing:
+        print(f"Export: {missing} filtered slugs had no collection info; wrote the slug only")
+
+
+def _write_csv(fh: IO, rows: Iterable[ExportRow]) -> int:
+    writer = csv.writer(fh)
+    writer.writerow(["collection_slug", "general_info", "stats"])
+    written = 0
+    for slug, general_info, stats in rows:
+        writer.writerow([slug, _dumps(general_info), _dumps(stats)])
+        written += 1
+    return written
+
+
+def _write_ndjson(fh: IO, rows: Iterable[ExportRow]) -> int:
+    written = 0
+    for slug, general_info, stats in rows:
+        fh.write(_dumps({"collection_slug": slug, "general_info": general_info, "stats": stats}) + "\n")
+        written += 1
+    return written
+
+
+def _write_parquet(fh: IO, rows: Iterable[ExportRow], compression: str = "zstd") -> int:
+    """Flat columns (slug, name, one float64 column per stats_table column) plus the JSON of both objects."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    # imported here: stats_table depends on opensea_tools, which imports this module
+    from stats_table import StatsTable, COLUMNS
+
+    schema = pa.schema([("collection_slug", pa.string()), ("name", pa.string())]
+                       + [(name, pa.float64()) for name in COLUMNS]
+                       + [("general_info", pa.string()), ("stats", pa.string())])
+
+    def write_batch(writer, batch) -> int:
+        # rows without stats get an empty dict, i.e. NaN in every numeric column
+        table = StatsTable.from_stats((slug, stats if isinstance(stats, dict) else {}) for slug, _, stats in batch)
+        arrays = [pa.array([slug for slug, _, _ in batch], pa.string()),
+                  pa.array([info.get("name") for _, info, _ in batch], pa.string())]
+        arrays += [pa.array(table.columns[name], pa.float64()) for name in COLUMNS]
+        arrays += [pa.array([_dumps(info) for _, info, _ in batch], pa.string()),
+                   pa.array([_dumps(stats) for _, _, stats in batch], pa.string())]
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        return len(batch)
+
+    written = 0
+    with pq.ParquetWriter(fh, schema, compression=compression) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= PARQUET_BATCH_ROWS:
+                written += write_batch(writer, batch)
+                batch = []
+        if batch:
+            written += write_batch(writer, batch)
+    return written
+
+
+def export_filtered_collections(all_collections: Iterable[Collection], filtered_collections: Any,
+                                filename: str, fmt: Optional[str] = None, slim: bool = False) -> int:
+    """Write one row per filtered collection to `filename` atomically; returns the number of rows."""
+    fmt = fmt or infer_format(filename)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}, expected one of {FORMATS}")
+    rows = iter_export_rows(all_collections, filtered_collections, slim)
+    if fmt == PARQUET:
+        with atomic_open(filename, "wb") as fh:
+            return _write_parquet(fh, rows)
+    with atomic_open(filename, "w", newline="" if fmt == CSV else None, encoding="utf-8") as fh:
+        return _write_csv(fh, rows) if fmt == CSV else _write_ndjson(fh, rows)
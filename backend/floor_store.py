@@ -0,0 +1,295 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (c) 2025 Danila Novik & Heorhi Shtsivel
+
+"""
+SQLite-backed floor price history (replaces the append-only floor_prices.csv).
+
+Samples live in one table keyed by (slug, ts), so "history of slug X between A and B" is an
+index range scan whose cost depends on the size of the answer, not of the whole history.
+The database runs in WAL mode so API readers never block the scheduler's batch writes.
+
+`floor_latest` keeps the newest sample per slug plus a sequence number bumped by every write
+transaction, so "what changed since I last looked" (changes_since) is a small indexed query
+that works no matter which process (API or scheduler worker) wrote the rows.
+
+`floor_ohlc` holds open/high/low/close and sample counts per slug in 1h, 1d and 1w buckets (UTC,
+weeks starting Monday). Every write_batch folds its new samples into those buckets in the same
+transaction, so a chart range costs one row per bucket, however many raw samples it covers.
+"""
+import csv
+import os
+import sqlite3
+import datetime
+import threading
+from typing import Any, Iterable, List, Optional, Sequence, Tuple, Union
+
+DB_PATH = os.getenv("FLOOR_DB_PATH", "floor_prices.db")
+
+Timestamp = Union[int, float, str, datetime.datetime]
+
+# rollup resolution -> bucket length in seconds
+RESOLUTIONS = {"1h": 3600, "1d": 86400, "1w": 7 * 86400}
+# buckets are aligned to epoch + offset: the epoch was a Thursday, so weeks are shifted to start on Monday
+_BUCKET_OFFSETS = {3600: 0, 86400: 0, 7 * 86400: 4 * 86400}
+
+# one incoming sample (open = high = low = close) folded into an existing bucket
+_UPSERT_OHLC = (
+    "INSERT INTO floor_ohlc (slug, resolution, bucket, open, high, low, close, open_ts, close_ts, count)"
+    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)"
+    " ON CONFLICT(slug, resolution, bucket) DO UPDATE SET"
+    " open = CASE WHEN excluded.open_ts < open_ts THEN excluded.open ELSE open END,"
+    " close = CASE WHEN excluded.close_ts >= close_ts THEN excluded.close ELSE close END,"
+    " open_ts = MIN(open_ts, excluded.open_ts),"
+    " close_ts = MAX(close_ts, excluded.close_ts),"
+    " high = MAX(high, excluded.high),"
+    " low = MIN(low, excluded.low),"
+    " count = count + 1"
+)
+
+# buckets rebuilt from the raw samples (backfill, or samples that replaced an earlier value);
+# parameters: resolution, bucket offset, resolution, then the WHERE clause's own
+_REBUILD_OHLC = (
+    "INSERT OR REPLACE INTO floor_ohlc (slug, resolution, bucket, open, high, low, close, open_ts, close_ts, count)"
+    " SELECT g.slug, g.resolution, g.bucket, o.floor, g.high, g.low, c.floor, g.open_ts, g.close_ts, g.n FROM ("
+    "  SELECT slug, ? AS resolution, ts - (ts - ?) % ? AS bucket,"
+    "   MIN(ts) AS open_ts, MAX(ts) AS close_ts, MAX(floor) AS high, MIN(floor) AS low, COUNT(*) AS n"
+    "  FROM floor_prices {where} GROUP BY slug, bucket"
+    " ) g"
+    " JOIN floor_prices o ON o.slug = g.slug AND o.ts = g.open_ts"
+    " JOIN floor_prices c ON c.slug = g.slug AND c.ts = g.close_ts"
+)
+
+
+def to_epoch(value: Timestamp) -> int:
+    """Convert epoch seconds, an ISO-8601 string or a datetime (naive = UTC) to integer epoch seconds."""
+    if isinstance(value, datetime.datetime):
+        dt = value
+    elif isinstance(value, (int, float)):
+        return int(value)
+    else:
+        text = str(value).strip()
+        try:
+            return int(float(text))
+        except ValueError:
+            pass
+        dt = datetime.datetime.fromisoformat(text.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return int(dt.timestamp())
+
+
+def bucket_start(epoch: int, seconds: int) -> int:
+    """Start of the rollup bucket of length `seconds` that contains `epoch`."""
+    return epoch - (epoch - _BUCKET_OFFSETS.get(seconds, 0)) % seconds
+
+
+def to_iso(epoch: int) -> str:
+    return datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc).replace(tzinfo=None).isoformat()
+
+
+class FloorStore:
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        # sqlite3 connections are not shareable across threads; keep one per thread
+        self._local = threading.local()
+        self._init_schema()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS floor_prices ("
+                " slug TEXT NOT NULL,"
+                " ts INTEGER NOT NULL,"
+                " floor REAL NOT NULL,"
+                " PRIMARY KEY (slug, ts)"
+                ") WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS floor_latest ("
+                " slug TEXT PRIMARY KEY,"
+                " ts INTEGER NOT NULL,"
+                " floor REAL NOT NULL,"
+                " seq INTEGER NOT NULL"
+                ")"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS floor_latest_seq ON floor_latest (seq)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS floor_ohlc ("
+                " slug TEXT NOT NULL,"
+                " resolution INTEGER NOT NULL,"
+                " bucket INTEGER NOT NULL,"
+                " open REAL NOT NULL,"
+                " high REAL NOT NULL,"
+                " low REAL NOT NULL,"
+                " close REAL NOT NULL,"
+                " open_ts INTEGER NOT NULL,"
+                " close_ts INTEGER NOT NULL,"
+                " count INTEGER NOT NULL,"
+                " PRIMARY KEY (slug, resolution, bucket)"
+                ") WITHOUT ROWID"
+            )
+            # databases created before floor_latest existed: seed it from the history once
+            if conn.execute("SELECT 1 FROM floor_latest LIMIT 1").fetchone() is None:
+                conn.execute("INSERT INTO floor_latest (slug, ts, floor, seq)"
+                             " SELECT slug, MAX(ts), floor, 0 FROM floor_prices GROUP BY slug")
+            # databases created before floor_ohlc existed: roll up the whole history once
+            if conn.execute("SELECT 1 FROM floor_ohlc LIMIT 1").fetchone() is None:
+                for seconds in RESOLUTIONS.values():
+                    conn.execute(_REBUILD_OHLC.format(where=""), (seconds, _BUCKET_OFFSETS[seconds], seconds))
+
+    def write_batch(self, rows: Iterable[Sequence[Any]]) -> int:
+        """
+        Write [timestamp, slug, floor] rows in one transaction. Rows without a floor are skipped
+        (a failed fetch carries no price information). Returns the number of rows written.
+        New samples are folded into the OHLC rollups; a sample that replaces an existing (slug, ts)
+        has its buckets recomputed from the raw samples instead, since a high or low cannot be undone.
+        """
+        records: List[Tuple[str, int, float]] = []
+        for ts, slug, floor in rows:
+            if floor is None or not slug:
+                continue
+            records.append((slug, to_epoch(ts), float(floor)))
+        if not records:
+            return 0
+        conn = self._conn()
+        with conn:
+            replaced: List[Tuple[str, int, float]] = []
+            for record in records:
+                if not conn.execute("INSERT OR IGNORE INTO floor_prices (slug, ts, floor) VALUES (?, ?, ?)", record).rowcount:
+                    replaced.append(record)
+            if replaced:
+                conn.executemany("UPDATE floor_prices SET floor = ? WHERE slug = ? AND ts = ?",
+                                 [(floor, slug, ts) for slug, ts, floor in replaced])
+            replaced_keys = {(slug, ts) for slug, ts, _ in replaced}
+            for seconds in RESOLUTIONS.values():
+                conn.executemany(_UPSERT_OHLC, [
+                    (slug, seconds, bucket_start(ts, seconds), floor, floor, floor, floor, ts, ts)
+                    for slug, ts, floor in records if (slug, ts) not in replaced_keys])
+                for slug, bucket in {(slug, bucket_start(ts, seconds)) for slug, ts, _ in replaced}:
+                    conn.execute(_REBUILD_OHLC.format(where="WHERE slug = ? AND ts >= ? AND ts < ?"),
+                                 (seconds, _BUCKET_OFFSETS[seconds], seconds, slug, bucket, bucket + seconds))
+            # read after the insert: the transaction now holds the write lock, so seq is race-free across processes
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM floor_latest").fetchone()[0]
+            conn.executemany(
+                "INSERT INTO floor_latest (slug, ts, floor, seq) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(slug) DO UPDATE SET ts = excluded.ts, floor = excluded.floor, seq = excluded.seq"
+                " WHERE excluded.ts >= floor_latest.ts",
+                [(slug, ts, floor, seq) for slug, ts, floor in records])
+        return len(records)
+
+    def history(self, slug: str, start: Optional[Timestamp] = None, end: Optional[Timestamp] = None,
+                limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Samples for `slug` with start <= ts <= end (both optional), oldest first, as (epoch, floor)."""
+        sql = "SELECT ts, floor FROM floor_prices WHERE slug = ?"
+        args: List[Any] = [slug]
+        if start is not None:
+            sql += " AND ts >= ?"
+            args.append(to_epoch(start))
+        if end is not None:
+            sql += " AND ts <= ?"
+            args.append(to_epoch(end))
+        sql += " ORDER BY ts"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+        return list(self._conn().execute(sql, args))
+
+    def ohlc(self, slug: str, resolution: str = "1h", start: Optional[Timestamp] = None,
+             end: Optional[Timestamp] = None, limit: Optional[int] = None) -> List[Tuple[int, float, float, float, float, int]]:
+        """
+        Rollup buckets for `slug` at `resolution` ("1h", "1d", "1w") overlapping start..end (both optional),
+        oldest first, as (bucket_start, open, high, low, close, count). With `limit` and no `start`,
+        the newest `limit` buckets are returned.
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution {resolution!r}, expected one of {tuple(RESOLUTIONS)}")
+        seconds = RESOLUTIONS[resolution]
+        sql = "SELECT bucket, open, high, low, close, count FROM floor_ohlc WHERE slug = ? AND resolution = ?"
+        args: List[Any] = [slug, seconds]
+        if start is not None:
+            sql += " AND bucket >= ?"
+            args.append(bucket_start(to_epoch(start), seconds))
+        if end is not None:
+            sql += " AND bucket <= ?"
+            args.append(to_epoch(end))
+        newest_first = limit is not None and start is None
+        sql += " ORDER BY bucket DESC" if newest_first else " ORDER BY bucket"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+        rows = self._conn().execute(sql, args).fetchall()
+        return rows[::-1] if newest_first else rows
+
+    def latest(self, slug: str, at_or_before: Optional[Timestamp] = None) -> Optional[Tuple[int, float]]:
+        """Most recent sample for `slug`, optionally no later than `at_or_before`."""
+        if at_or_before is None:
+            row = self._conn().execute(
+                "SELECT ts, floor FROM floor_prices WHERE slug = ? ORDER BY ts DESC LIMIT 1", (slug,)).fetchone()
+        else:
+            row = self._conn().execute(
+                "SELECT ts, floor FROM floor_prices WHERE slug = ? AND ts <= ? ORDER BY ts DESC LIMIT 1",
+                (slug, to_epoch(at_or_before))).fetchone()
+        return tuple(row) if row else None
+
+    def latest_all(self) -> List[Tuple[str, int, float]]:
+        """Newest (slug, epoch, floor) for every slug."""
+        return list(self._conn().execute("SELECT slug, ts, floor FROM floor_latest"))
+
+    def changes_since(self, seq: int) -> Tuple[List[Tuple[str, int, float]], int]:
+        """
+        Slugs whose newest sample was written after sequence number `seq`, as (slug, epoch, floor),
+        and the sequence number to pass next time.
+        """
+        conn = self._conn()
+        rows = conn.execute("SELECT slug, ts, floor, seq FROM floor_latest WHERE seq > ? ORDER BY seq", (int(seq),)).fetchall()
+        if not rows:
+            return [], int(seq)
+        return [(slug, ts, floor) for slug, ts, floor, _ in rows], rows[-1][3]
+
+    def recent(self, slug: str, n: int) -> List[Tuple[int, float]]:
+        """Last `n` samples for `slug`, oldest first."""
+        rows = self._conn().execute(
+            "SELECT ts, floor FROM floor_prices WHERE slug = ? ORDER BY ts DESC LIMIT ?", (slug, int(n))).fetchall()
+        return rows[::-1]
+
+    def import_csv(self, csv_path: str, batch_size: int = 5000) -> int:
+        """Load a legacy floor_prices.csv (timestamp_utc, collection_slug, floor_price). Returns rows imported."""
+        imported = 0
+        batch: List[List[Any]] = []
+        with open(csv_path, newline="", encoding="utf-8") as fh:
+            for rec in csv.DictReader(fh):
+                floor = rec.get("floor_price")
+                try:
+                    floor = float(floor) if floor not in (None, "", "None") else None
+                except ValueError:
+                    floor = None
+                batch.append([rec.get("timestamp_utc"), rec.get("collection_slug"), floor])
+                if len(batch) >= batch_size:
+                    imported += self.write_batch(batch)
+                    batch = []
+        imported += self.write_batch(batch)
+        return imported
+
+
+_floor_store: Optional[FloorStore] = None
+_floor_store_lock = threading.Lock()
+
+
+def get_floor_store() -> FloorStore:
+    """Process-wide store at DB_PATH, opened on first use."""
+    global _floor_store
+    with _floor_store_lock:
+        if _floor_store is None:
+            _floor_store = FloorStore(DB_PATH)
+        return _floor_store
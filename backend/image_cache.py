@@ -0,0 +1,344 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (c) 2025 Danila Novik & Heorhi Shtsivel
+
+"""
+On-disk cache of small collection thumbnails for the bubble chart.
+
+The chart draws each collection image at a few dozen pixels, but `image_url` usually points at a
+full-size PNG. After a pipeline run (and on startup) the images of the chart's collections are
+fetched once in the background and stored as square WebP thumbnails in THUMB_SIZES, named after a
+hash of the source URL: `<dir>/<key[:2]>/<key>_<size>.webp`. GET /images/{key} serves them with a
+one-year immutable Cache-Control, which is safe because a changed image_url is a new key.
+
+The directory is bounded by IMAGE_CACHE_MAX_BYTES; the least recently served images go first.
+Image downloads go to the CDN, not the OpenSea API, so they do not use the upstream rate limiter.
+
+IMAGE_CACHE_SOURCE=<dir> reads images from a local directory (by the file name in the URL path)
+instead of the network, for tests and offline runs. Otherwise image URLs (which come from upstream
+data) are only fetched over http(s) from public addresses: other schemes, loopback, private and
+link-local hosts are refused, redirects included, so the server cannot be pointed at itself.
+Needs Pillow; without it nothing is cached and /images redirects to the original image.
+
+Run:
+    python image_cache.py prefetch          # thumbnails for the collections in filtered_collections.csv
+    python image_cache.py stats
+"""
+import argparse
+import hashlib
+import io
+import ipaddress
+import os
+import re
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from export import atomic_open
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # thumbnails are optional; /images falls back to the original URL
+    Image = None
+    ImageOps = None
+
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "image_cache")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+IMAGE_CACHE_SOURCE = os.getenv("IMAGE_CACHE_SOURCE") or None
+# thumbnail edge lengths in pixels: bubble-sized, and for large bubbles / high-DPI screens
+THUMB_SIZES = (96, 256)
+WEBP_QUALITY = 80
+# source images larger than this are not downloaded
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+# a URL that failed is not retried before this many seconds
+FAILURE_TTL = 3600.0
+# redirects followed per source image (each hop is checked like the original URL)
+MAX_REDIRECTS = 3
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+MEDIA_TYPE = "image/webp"
+
+_KEY_RE = re.compile(r"[0-9a-f]{24}")
+
+
+def image_key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()[:24]
+
+
+def check_public_url(url: str) -> None:
+    """Raise ValueError unless `url` is http(s) and its host resolves only to public addresses."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"refusing to fetch {url!r}: only http(s) URLs are allowed")
+    try:
+        infos = socket.getaddrinfo(parts.hostname, parts.port or (443 if parts.scheme == "https" else 80),
+                                   proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError) as e:
+        raise ValueError(f"cannot resolve {parts.hostname}: {e}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"refusing to fetch {url!r}: {parts.hostname} resolves to non-public {address}")
+
+
+def make_thumbnails(data: bytes, sizes: Iterable[int] = THUMB_SIZES) -> Dict[int, bytes]:
+    """Square, center-cropped WebP thumbnails of an image (first frame if animated); never upscaled."""
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+        img = img.convert("RGBA" if has_alpha else "RGB")
+        side = min(img.size)
+        left, top = (img.width - side) // 2, (img.height - side) // 2
+        square = img.crop((left, top, left + side, top + side))
+    out: Dict[int, bytes] = {}
+    # largest first, each size resampled from the previous one: far cheaper than from the full image
+    for size in sorted(set(sizes), reverse=True):
+        target = min(size, square.width)
+        if target < square.width:
+            square = square.resize((target, target), Image.LANCZOS, reducing_gap=3.0)
+        buf = io.BytesIO()
+        square.save(buf, "WEBP", quality=WEBP_QUALITY, method=4)
+        out[size] = buf.getvalue()
+    return out
+
+
+class ImageCache:
+
+    def __init__(self, directory: str = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_MAX_BYTES,
+                 sizes: Iterable[int] = THUMB_SIZES, source_dir: Optional[str] = IMAGE_CACHE_SOURCE,
+                 enabled: bool = Image is not None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.sizes = tuple(sorted(set(sizes)))
+        self.source_dir = source_dir
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # key -> bytes on disk (all sizes), least recently used first; read from disk on first use
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._loaded = False
+        # key -> source URL, registered by prefetch(); needed to build a thumbnail on demand
+        self._urls: Dict[str, str] = {}
+        self._failed: Dict[str, float] = {}
+        self._inflight: Dict[str, threading.Event] = {}
+        self._session: Optional[requests.Session] = None
+        self.hits = 0
+        self.misses = 0
+        self.fetched = 0
+        self.failures = 0
+        self.evictions = 0
+
+    def path(self, key: str, size: int) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}_{size}.webp")
+
+    def _load(self) -> None:
+        # caller holds the lock
+        if self._loaded:
+            return
+        self._loaded = True
+        found: Dict[str, List[float]] = {}
+        if os.path.isdir(self.directory):
+            for shard in os.listdir(self.directory):
+                shard_dir = os.path.join(self.directory, shard)
+                if not os.path.isdir(shard_dir):
+                    continue
+                for name in os.listdir(shard_dir):
+                    key, _, rest = name.partition("_")
+                    if not _KEY_RE.fullmatch(key) or not rest.endswith(".webp"):
+                        continue
+                    st = os.stat(os.path.join(shard_dir, name))
+                    entry = found.setdefault(key, [0.0, 0])
+                    entry[0] = max(entry[0], st.st_mtime)
+                    entry[1] += st.st_size
+        # serving a thumbnail touches its mtime, so mtime order is the LRU order across restarts
+        for key, (_, size) in sorted(found.items(), key=lambda item: item[1][0]):
+            self._entries[key] = size
+            self._bytes += size
+
+    def _get_session(self) -> requests.Session:
+        if self._session is None:
+            s = requests.Session()
+            s.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=8))
+            s.mount("http://", HTTPAdapter(pool_connections=8, pool_maxsize=8))
+            s.headers.update({"User-Agent": "nft-bubbles-thumbnailer"})
+            self._session = s
+        return self._session
+
+    def _read_source(self, url: str) -> bytes:
+        if self.source_dir:
+            path = os.path.join(self.source_dir, os.path.basename(urlsplit(url).path))
+            if os.path.getsize(path) > MAX_SOURCE_BYTES:
+                raise ValueError(f"{path} is larger than {MAX_SOURCE_BYTES} bytes")
+            with open(path, "rb") as fh:
+                return fh.read()
+        for _ in range(MAX_REDIRECTS + 1):
+            check_public_url(url)
+            with self._get_session().get(url, timeout=15, stream=True, allow_redirects=False) as resp:
+                if resp.is_redirect:
+                    url = urljoin(url, resp.headers["Location"])
+                    continue
+                resp.raise_for_status()
+                chunks, total = [], 0
+                for chunk in resp.iter_content(64 * 1024):
+                    total += len(chunk)
+                    if total > MAX_SOURCE_BYTES:
+                        raise ValueError(f"{url} is larger than {MAX_SOURCE_BYTES} bytes")
+                    chunks.append(chunk)
+                return b"".join(chunks)
+        raise ValueError(f"too many redirects for {url}")
+
+    def register(self, url: str) -> str:
+        key = image_key(url)
+        with self._lock:
+            self._urls[key] = url
+        return key
+
+    def source_url(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._urls.get(key)
+
+    def ensure(self, url: str) -> bool:
+        """Build the thumbnails for `url` unless cached; True if they are on disk afterwards."""
+        if not self.enabled:
+            return False
+        key = self.register(url)
+        with self._lock:
+            self._load()
+            if key in self._entries:
+                return True
+            failed_at = self._failed.get(key)
+            if failed_at is not None and time.time() - failed_at < FAILURE_TTL:
+                return False
+            waiter = self._inflight.get(key)
+            if waiter is None:
+                self._inflight[key] = threading.Event()
+        if waiter is not None:
+            # the same image is being built by another thread; wait for it
+            waiter.wait(30)
+            with self._lock:
+                return key in self._entries
+        try:
+            thumbs = make_thumbnails(self._read_source(url), self.sizes)
+            written = 0
+            for size, data in thumbs.items():
+                with atomic_open(self.path(key, size), "wb") as fh:
+                    fh.write(data)
+                written += len(data)
+            with self._lock:
+                self._entries[key] = written
+                self._bytes += written
+                self._failed.pop(key, None)
+                self.fetched += 1
+                self._evict(keep=key)
+            return True
+        except Exception as e:
+            print(f"[images] thumbnail failed for {url}: {e}")
+            with self._lock:
+                self._failed[key] = time.time()
+                self.failures += 1
+            return False
+        finally:
+            with self._lock:
+                event = self._inflight.pop(key, None)
+            if event is not None:
+                event.set()
+
+    def _evict(self, keep: str) -> None:
+        # caller holds the lock
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = next(iter(self._entries.items()))
+            if key == keep:
+                break
+            del self._entries[key]
+            self._bytes -= size
+            self.evictions += 1
+            for s in self.sizes:
+                try:
+                    os.remove(self.path(key, s))
+                except OSError:
+                    pass
+
+    def get(self, key: str, size: int) -> Optional[str]:
+        """Path of the smallest thumbnail at least `size` px (else the largest), building it if the URL is known."""
+        if not self.enabled or not _KEY_RE.fullmatch(key):
+            return None
+        size = next((s for s in self.sizes if s >= size), self.sizes[-1])
+        with self._lock:
+            self._load()
+            cached = key in self._entries
+            if cached:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            url = self._urls.get(key)
+        if not cached and (url is None or not self.ensure(url)):
+            return None
+        path = self.path(key, size)
+        try:
+            os.utime(path)
+        except OSError:
+            # evicted between the lookup and now
+            return None
+        return path
+
+    def prefetch(self, urls: Iterable[Optional[str]], max_workers: int = 4) -> threading.Thread:
+        """Register `urls` right away and build their missing thumbnails in a background thread."""
+        todo = list(dict.fromkeys(u for u in urls if isinstance(u, str) and u))
+        for url in todo:
+            self.register(url)
+
+        def run():
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                done = sum(executor.map(self.ensure, todo))
+            print(f"[images] {done}/{len(todo)} thumbnails ready in {time.perf_counter() - started:.1f}s")
+
+        thread = threading.Thread(target=run, name="image-prefetch", daemon=True)
+        if self.enabled and todo:
+            thread.start()
+        return thread
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._load()
+            return {
+                "enabled": self.enabled,
+                "images": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "sizes": list(self.sizes),
+                "known_urls": len(self._urls),
+                "hits": self.hits,
+                "misses": self.misses,
+                "fetched": self.fetched,
+                "failures": self.failures,
+                "evictions": self.evictions,
+            }
+
+
+# shared by the API's /images endpoint and the post-pipeline prefetch
+image_cache = ImageCache()
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Collection thumbnail cache")
+    parser.add_argument("command", choices=["prefetch", "stats"])
+    parser.add_argument("--csv", default="filtered_collections.csv", help="collections to prefetch (prefetch)")
+    args = parser.parse_args(argv)
+
+    if args.command == "prefetch":
+        from snapshot import SnapshotHolder
+        holder = SnapshotHolder()
+        holder.load_csv(args.csv)
+        image_cache.prefetch(holder.image_urls()).join()
+    print(image_cache.stats())
+
+
+if __name__ == "__main__":
+    main()
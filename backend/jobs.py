@@ -0,0 +1,158 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (c) 2025 Danila Novik & Heorhi Shtsivel
+
+"""
+Background jobs for long-running endpoints (/filter, /run_pipeline).
+
+A job runs on a small bounded worker pool and reports progress counters plus a partial
+result while it runs. Submitting the same kind + parameters while an identical job is still
+pending or running returns that job instead of starting another one.
+"""
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATUSES = (PENDING, RUNNING)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+
+    def __init__(self, kind: str, params: Dict[str, Any], key: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.key = key
+        self.status = PENDING
+        # counters updated by the work function, e.g. pages_fetched / slugs_checked / slugs_accepted
+        self.progress: Dict[str, int] = {}
+        # partial result while running, final result once done
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+
+    def check_cancelled(self) -> None:
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def cancellable(self, iterable: Iterable[Any]) -> Iterator[Any]:
+        """Wrap an iterable so the job stops (raises JobCancelled) at the next item after cancel()."""
+        for item in iterable:
+            self.check_cancelled()
+            yield item
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": self.params,
+            "progress": dict(self.progress),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if include_result:
+            data["result"] = self.result
+        return data
+
+
+class JobManager:
+
+    def __init__(self, max_workers: int = 2, max_finished: int = 100):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active_by_key: Dict[str, Job] = {}
+        self.max_finished = max_finished
+
+    def submit(self, kind: str, params: Dict[str, Any], work: Callable[[Job], Any]) -> Tuple[Job, bool]:
+        """
+        Queue `work(job)` unless an identical job is pending or running.
+        Returns (job, created) where created is False for a deduplicated submission.
+        """
+        key = kind + ":" + json.dumps(params, sort_keys=True, default=str)
+        with self._lock:
+            existing = self._active_by_key.get(key)
+            if existing is not None and not existing.cancel_event.is_set():
+                return existing, False
+            job = Job(kind, params, key)
+            self._jobs[job.id] = job
+            self._active_by_key[key] = job
+            self._prune()
+        self._executor.submit(self._run, job, work)
+        return job, True
+
+    def _run(self, job: Job, work: Callable[[Job], Any]) -> None:
+        if job.cancel_event.is_set():
+            self._finish(job, CANCELLED)
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = work(job)
+            self._finish(job, DONE)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, FAILED)
+
+    def _finish(self, job: Job, status: str) -> None:
+        with self._lock:
+            job.status = status
+            job.finished_at = time.time()
+            if self._active_by_key.get(job.key) is job:
+                del self._active_by_key[job.key]
+
+    def _prune(self) -> None:
+        # caller holds the lock; drop the oldest finished jobs beyond max_finished
+        finished = [j for j in self._jobs.values() if j.status not in ACTIVE_STATUSES]
+        for job in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> list:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Request cancellation; a running job stops at its next checkpoint, a pending one never starts.
+        The job stops counting as active right away, so resubmitting its parameters starts a new job.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status in ACTIVE_STATUSES:
+                job.cancel_event.set()
+                if self._active_by_key.get(job.key) is job:
+                    del self._active_by_key[job.key]
+        return job
+
+    def shutdown(self) -> None:
+        for job in self.list_jobs():
+            job.cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# shared by the API process
+job_manager = JobManager()
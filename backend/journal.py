@@ -0,0 +1,391 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (c) 2025 Danila Novik & Heorhi Shtsivel
+
+"""
+Disk-backed journal of raw OpenSea responses, for warm restarts and offline replay.
+
+Every successful upstream response (collections pages and per-slug stats) is stored gzip-compressed
+under `blobs/<sha[:2]>/<sha>.json.gz`, addressed by the SHA-256 of its body, so an unchanged response
+is stored once however often it is fetched. `index.ndjson` records one line per response:
+{"ts": fetched_at, "kind": "stats" | "collections", "key": slug or page params, "sha": ...}.
+
+- warm_stats_cache() loads the newest stats per slug into the stats cache with their original
+  fetch times, so fresh entries are served at once and older ones refresh in the background.
+- With OPENSEA_REPLAY=1 (or a session from make_replay_session()) every upstream call is
+  answered from the journal and nothing goes to the network.
+
+Run:
+    python journal.py stats
+    python journal.py replay --interval 7d --max-results 30
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): compaction then assumes a single writing process
+    fcntl = None
+
+JOURNAL_DIR = os.getenv("OPENSEA_JOURNAL_DIR", "journal")
+# OPENSEA_JOURNAL=0 turns recording off
+JOURNAL_ENABLED = os.getenv("OPENSEA_JOURNAL", "1") != "0"
+# OPENSEA_REPLAY=1 serves every upstream call from the journal
+REPLAY = os.getenv("OPENSEA_REPLAY", "0") == "1"
+
+STATS, COLLECTIONS = "stats", "collections"
+# appends between checks whether the index needs compacting (compact_if_needed, in a background thread)
+COMPACT_CHECK_EVERY = 1000
+
+# only these query parameters identify a collections page
+PAGE_PARAMS = ("chain", "order_by", "limit", "cursor")
+
+_PATH_RE = re.compile(r"/collections(?:/([^/]+)/stats)?/?$")
+
+Key = Tuple[str, str]
+
+
+def request_key(url: str, params: Optional[Dict[str, Any]] = None) -> Optional[Key]:
+    """(kind, key) for an upstream URL (+ params), or None if the journal does not cover it."""
+    parts = urlsplit(url)
+    match = _PATH_RE.search(parts.path)
+    if match is None:
+        return None
+    if match.group(1):
+        return STATS, match.group(1)
+    query = dict(parse_qsl(parts.query))
+    query.update({k: v for k, v in (params or {}).items() if v is not None})
+    # values as strings so recorded params (ints) and replayed URLs (text) give the same key
+    page = {k: str(query[k]) for k in PAGE_PARAMS if k in query}
+    return COLLECTIONS, json.dumps(page, sort_keys=True)
+
+
+class Journal:
+
+    def __init__(self, path: str = JOURNAL_DIR, enabled: bool = True):
+        self.path = path
+        # record_response() is a no-op when False; record() always writes
+        self.enabled = enabled
+        self.index_path = os.path.join(path, "index.ndjson")
+        # flock target shared by every process: appends hold it shared, compaction exclusive
+        self.lock_path = os.path.join(path, "index.lock")
+        self._lock = threading.Lock()
+        self._compacting = False
+        # newest entry per key, filled by load(); {(kind, key): (ts, sha)}
+        self._latest: Dict[Key, Tuple[float, str]] = {}
+        self._loaded = False
+        self.index_lines = 0
+        self.recorded = 0
+        self.replayed = 0
+        self.replay_misses = 0
+
+    def _blob_path(self, sha: str) -> str:
+        return os.path.join(self.path, "blobs", sha[:2], f"{sha}.json.gz")
+
+    @contextmanager
+    def _index_lock(self, exclusive: bool = False) -> Iterator[None]:
+        """Cross-process lock on the index (a separate file, since compaction replaces the index)."""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.path, exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            os.close(fd)
+
+    def record(self, kind: str, key: str, body: bytes, fetched_at: Optional[float] = None) -> str:
+        """Store one response body; returns its content hash."""
+        sha = hashlib.sha256(body).hexdigest()
+        blob = self._blob_path(sha)
+        ts = time.time() if fetched_at is None else fetched_at
+        line = json.dumps({"ts": ts, "kind": kind, "key": key, "sha": sha}, separators=(",", ":")) + "\n"
+        # the shared lock keeps a compaction from running between the blob write and its index line
+        # (it would delete the blob as unreferenced) or during the append (the rewrite would drop it)
+        with self._index_lock():
+            if os.path.exists(blob):
+                # touch it so a concurrent compaction treats it as in use
+                os.utime(blob)
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                tmp = f"{blob}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as fh:
+                    fh.write(gzip.compress(body, compresslevel=6))
+                os.replace(tmp, blob)
+            # one O_APPEND write per line, so lines from several processes never interleave
+            fd = os.open(self.index_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode("utf-8"))
+            finally:
+                os.close(fd)
+        with self._lock:
+            self.recorded += 1
+            self.index_lines += 1
+            if self._loaded:
+                current = self._latest.get((kind, key))
+                if current is None or ts >= current[0]:
+                    self._latest[(kind, key)] = (ts, sha)
+            check = self.recorded % COMPACT_CHECK_EVERY == 0 and not self._compacting
+            if check:
+                self._compacting = True
+        if check:
+            # long-running processes (API, scheduler workers) keep recording; keep the index bounded
+            threading.Thread(target=self._compact_in_background, name="journal-compact", daemon=True).start()
+        return sha
+
+    def _compact_in_background(self) -> None:
+        try:
+            self.compact_if_needed()
+        except OSError as e:
+            print(f"[journal] compaction failed: {e}")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def record_response(self, url: str, params: Optional[Dict[str, Any]], resp: requests.Response) -> None:
+        if not self.enabled or resp.status_code != 200:
+            return
+        key = request_key(url, params)
+        if key is None:
+            return
+        try:
+            self.record(key[0], key[1], resp.content)
+        except OSError as e:
+            print(f"[journal] failed to record {key[0]} {key[1]}: {e}")
+
+    def _read_index(self) -> Iterator[Dict[str, Any]]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # a torn last line after a crash
+                        continue
+        except FileNotFoundError:
+            return
+
+    def load(self) -> int:
+        """Read the index into memory; returns the number of index lines."""
+        latest: Dict[Key, Tuple[float, str]] = {}
+        lines = 0
+        for entry in self._read_index():
+            lines += 1
+            key = (entry.get("kind"), entry.get("key"))
+            current = latest.get(key)
+            if current is None or entry.get("ts", 0) >= current[0]:
+                latest[key] = (entry.get("ts", 0), entry.get("sha"))
+        with self._lock:
+            self._latest = latest
+            self._loaded = True
+            self.index_lines = lines
+        return lines
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def read_blob(self, sha: str) -> Optional[bytes]:
+        try:
+            with open(self._blob_path(sha), "rb") as fh:
+                return gzip.decompress(fh.read())
+        except (OSError, EOFError) as e:
+            print(f"[journal] missing or damaged blob {sha}: {e}")
+            return None
+
+    def lookup(self, kind: str, key: str) -> Optional[Tuple[float, bytes]]:
+        """(fetched_at, body) of the newest response for (kind, key)."""
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._latest.get((kind, key))
+        if entry is None:
+            return None
+        body = self.read_blob(entry[1])
+        return None if body is None else (entry[0], body)
+
+    def latest_stats(self) -> Iterator[Tuple[str, float, Dict[str, Any]]]:
+        """(slug, fetched_at, stats) for every slug in the journal."""
+        self._ensure_loaded()
+        with self._lock:
+            entries = [(key, ts, sha) for (kind, key), (ts, sha) in self._latest.items() if kind == STATS]
+        for slug, ts, sha in entries:
+            body = self.read_blob(sha)
+            if body is None:
+                continue
+            try:
+                yield slug, ts, json.loads(body)
+            except ValueError:
+                continue
+
+    def warm_stats_cache(self, cache) -> int:
+        """Load the newest stats per slug into `cache` (a TTLCache) with their original fetch times."""
+        started = time.perf_counter()
+        count = 0
+        for slug, ts, stats in self.latest_stats():
+            cache.put(slug, stats, fetched_at=ts)
+            count += 1
+        if count:
+            print(f"[journal] warmed stats cache with {count} slugs in {time.perf_counter() - started:.2f}s")
+        return count
+
+    def compact(self) -> Tuple[int, int]:
+        """
+        Keep only the newest entry per key in the index and delete blobs nothing refers to.
+        Returns (index lines dropped, blobs deleted). Blobs written while this runs are kept, and
+        appends from other processes wait for the index rewrite (see _index_lock), so none is lost.
+        """
+        started = time.time()
+        # the blob sweep runs under the lock too: a record() reusing a blob (it only touches it) must not
+        # have it deleted between the sweep's check and os.remove while its new index line points to it
+        with self._index_lock(exclusive=True):
+            entries = list(self._read_index())
+            latest: Dict[Key, Dict[str, Any]] = {}
+            for entry in entries:
+                key = (entry.get("kind"), entry.get("key"))
+                if key not in latest or entry.get("ts", 0) >= latest[key].get("ts", 0):
+                    latest[key] = entry
+            tmp = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                for entry in sorted(latest.values(), key=lambda e: e.get("ts", 0)):
+                    fh.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            os.replace(tmp, self.index_path)
+
+            keep = {entry.get("sha") for entry in latest.values()}
+            deleted = 0
+            blobs_dir = os.path.join(self.path, "blobs")
+            for root, _, files in os.walk(blobs_dir):
+                for name in files:
+                    if name.endswith(".tmp"):
+                        # a blob being written, or left over from a crash mid-write
+                        continue
+                    full = os.path.join(root, name)
+                    sha = name.split(".", 1)[0]
+                    try:
+                        # the mtime check still matters without flock (no fcntl), where writers are not excluded
+                        if sha not in keep and os.path.getmtime(full) < started:
+                            os.remove(full)
+                            deleted += 1
+                    except OSError:
+                        continue
+        self.load()
+        return len(entries) - len(latest), deleted
+
+    def compact_if_needed(self, max_lines_per_key: float = 4.0) -> None:
+        """Compact once superseded lines outnumber live ones by `max_lines_per_key`."""
+        self._ensure_loaded()
+        if self.index_lines > max_lines_per_key * max(len(self._latest), 256):
+            dropped, deleted = self.compact()
+            print(f"[journal] compacted: dropped {dropped} index lines, deleted {deleted} blobs")
+
+    def stats(self) -> Dict[str, Any]:
+        self._ensure_loaded()
+        with self._lock:
+            kinds: Dict[str, int] = {}
+            for kind, _ in self._latest:
+                kinds[kind] = kinds.get(kind, 0) + 1
+            return {"path": self.path, "recording": self.enabled, "replay": REPLAY, "keys": kinds,
+                    "index_lines": self.index_lines,
+                    "recorded": self.recorded, "replayed": self.replayed, "replay_misses": self.replay_misses}
+
+
+class ReplayAdapter(BaseAdapter):
+    """requests transport that answers OpenSea calls from a Journal instead of the network."""
+
+    def __init__(self, journal: Journal):
+        super().__init__()
+        self.journal = journal
+
+    def send(self, request, **kwargs) -> requests.Response:
+        resp = requests.Response()
+        resp.request = request
+        resp.url = request.url
+        resp.headers["Content-Type"] = "application/json"
+        key = request_key(request.url)
+        found = self.journal.lookup(*key) if key else None
+        if found is not None:
+            resp.status_code = 200
+            resp._content = found[1]
+            self.journal.replayed += 1
+        elif key is not None and key[0] == COLLECTIONS:
+            # a page the journal never saw ends the crawl, like the last page upstream
+            resp.status_code = 200
+            resp._content = b'{"collections": [], "next": null}'
+            self.journal.replay_misses += 1
+        else:
+            resp.status_code = 404
+            resp._content = b'{"errors": ["not in journal"]}'
+            self.journal.replay_misses += 1
+        resp.reason = "OK" if resp.status_code == 200 else "Not Found"
+        return resp
+
+    def close(self) -> None:
+        pass
+
+
+def make_replay_session(journal: "Journal") -> requests.Session:
+    """Session whose every request is served from `journal`; marked `offline` so callers skip rate limiting."""
+    s = requests.Session()
+    adapter = ReplayAdapter(journal)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.offline = True
+    return s
+
+
+# process-wide journal used by opensea_tools and the API
+journal = Journal(JOURNAL_DIR, enabled=JOURNAL_ENABLED and not REPLAY)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect the response journal or replay the pipeline from it")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="show what the journal holds")
+    sub.add_parser("compact", help="drop superseded index lines and unreferenced blobs")
+    replay = sub.add_parser("replay", help="run fetch -> filter -> save against the journal only")
+    replay.add_argument("--interval", default="7d")
+    replay.add_argument("--vol-thresh", type=float, default=0.001)
+    replay.add_argument("--mcap-thresh", type=float, default=0.001)
+    replay.add_argument("--max-results", type=int, default=30)
+    replay.add_argument("--max-total", type=int, default=100)
+    replay.add_argument("--output", default="filtered_collections.replay.csv")
+    args = parser.parse_args(argv)
+
+    if args.command == "stats":
+        print(json.dumps(journal.stats(), indent=2))
+    elif args.command == "compact":
+        dropped, deleted = journal.compact()
+        print(f"Dropped {dropped} index lines, deleted {deleted} blobs")
+    else:
+        # imported here to avoid a circular import. Run as a script, this module is __main__, so opensea_tools
+        # sees a second Journal instance (journal.journal); the replay session below uses this one, whose
+        # counters are printed, and replay records nothing
+        from opensea_tools import fetch_collections, build_filtered_collections, save_filtered_collections_csv
+
+        session = make_replay_session(journal)
+        started = time.perf_counter()
+        collections = fetch_collections(session, chain="base", order_by="market_cap", page_limit=100,
+                                        max_total=args.max_total, pause=0)
+        filtered = build_filtered_collections(session, collections, interval=args.interval,
+                                              vol_thresh=args.vol_thresh, mcap_thresh=args.mcap_thresh,
+                                              max_results=args.max_results)
+        save_filtered_collections_csv(collections, filtered, filename=args.output)
+        print(f"Replayed {len(collections)} collections, {len(filtered)} accepted in "
+              f"{time.perf_counter() - started:.2f}s ({journal.replayed} responses from the journal, "
+              f"{journal.replay_misses} missing)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (c) 2025 Danila Novik & Heorhi Shtsivel
+
+"""
+Lease-based partitioning of the scheduler's slug set between worker processes.
+
+Workers share one SQLite file (by default the floor store). Each worker heartbeats, renews
+the leases it holds and claims unleased slugs up to its fair share (ceil(slugs / live workers)),
+giving back extras when new workers join. Leases and heartbeats expire after `lease_seconds`,
+so slugs held by a crashed worker are picked up by the others on their next renewal.
+Named locks (e.g. "crawl") use the same table so only one worker re-crawls the slug set.
+
+The same file also splits the upstream rate quota: every process calling OpenSea runs a RateShare,
+which heartbeats a weight and sets the process's limiter to its weight / the live total.
+"""
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Optional
+
+from rate_limiter import TokenBucket
+
+from floor_store import DB_PATH
+
+LEASE_DB_PATH = os.getenv("SCHEDULER_LEASE_DB", DB_PATH)
+# prefix for named locks so they never collide with collection slugs
+LOCK_PREFIX = "lock:"
+
+
+def make_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaseStore:
+
+    def __init__(self, path: str = LEASE_DB_PATH, lease_seconds: float = 120):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        # isolation_level=None: transactions are managed explicitly with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sched_slugs (slug TEXT PRIMARY KEY)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sched_leases ("
+                           " slug TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sched_leases_owner ON sched_leases (owner)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sched_workers (owner TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS rate_shares ("
+                           " owner TEXT PRIMARY KEY, weight REAL NOT NULL, expires_at REAL NOT NULL)")
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent workers serialize here
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def set_slugs(self, slugs: List[str]) -> None:
+        """Replace the shared slug set; leases on removed slugs are dropped."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM sched_slugs")
+            conn.executemany("INSERT OR IGNORE INTO sched_slugs (slug) VALUES (?)", [(s,) for s in slugs])
+            conn.execute("DELETE FROM sched_leases WHERE slug NOT LIKE ? AND slug NOT IN (SELECT slug FROM sched_slugs)",
+                         (LOCK_PREFIX + "%",))
+
+    def slug_count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM sched_slugs").fetchone()[0]
+
+    def acquire(self, owner: str, now: Optional[float] = None) -> List[str]:
+        """Heartbeat, renew, rebalance and claim; returns the slugs `owner` now holds."""
+        now = time.time() if now is None else now
+        expires = now + self.lease_seconds
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO sched_workers (owner, expires_at) VALUES (?, ?)", (owner, expires))
+            conn.execute("DELETE FROM sched_workers WHERE expires_at < ?", (now,))
+            conn.execute("DELETE FROM sched_leases WHERE expires_at < ?", (now,))
+            conn.execute("UPDATE sched_leases SET expires_at = ? WHERE owner = ? AND slug NOT LIKE ?",
+                         (expires, owner, LOCK_PREFIX + "%"))
+
+            live = conn.execute("SELECT COUNT(*) FROM sched_workers").fetchone()[0]
+            total = conn.execute("SELECT COUNT(*) FROM sched_slugs").fetchone()[0]
+            share = math.ceil(total / max(live, 1))
+            held = [r[0] for r in conn.execute(
+                "SELECT slug FROM sched_leases WHERE owner = ? AND slug NOT LIKE ? ORDER BY slug",
+                (owner, LOCK_PREFIX + "%"))]
+
+            if len(held) > share:
+                # someone joined: hand back the surplus so they can claim it
+                conn.executemany("DELETE FROM sched_leases WHERE slug = ?", [(s,) for s in held[share:]])
+                held = held[:share]
+            elif len(held) < share:
+                free = [r[0] for r in conn.execute(
+                    "SELECT slug FROM sched_slugs WHERE slug NOT IN (SELECT slug FROM sched_leases) LIMIT ?",
+                    (share - len(held),))]
+                conn.executemany("INSERT INTO sched_leases (slug, owner, expires_at) VALUES (?, ?, ?)",
+                                 [(s, owner, expires) for s in free])
+                held += free
+        return held
+
+    def renew(self, owner: str, now: Optional[float] = None) -> None:
+        """Heartbeat and extend the leases `owner` already holds, without rebalancing (safe mid-batch)."""
+        now = time.time() if now is None else now
+        expires = now + self.lease_seconds
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO sched_workers (owner, expires_at) VALUES (?, ?)", (owner, expires))
+            conn.execute("UPDATE sched_leases SET expires_at = ? WHERE owner = ? AND slug NOT LIKE ?",
+                         (expires, owner, LOCK_PREFIX + "%"))
+
+    def try_lock(self, name: str, owner: str, ttl: float, now: Optional[float] = None) -> bool:
+        """Take the named lock for `ttl` seconds if it is free or expired. Not renewed by acquire()."""
+        now = time.time() if now is None else now
+        key = LOCK_PREFIX + name
+        with self._transaction() as conn:
+            row = conn.execute("SELECT owner, expires_at FROM sched_leases WHERE slug = ?", (key,)).fetchone()
+            if row is not None and row[1] >= now and row[0] != owner:
+                return False
+            conn.execute("INSERT OR REPLACE INTO sched_leases (slug, owner, expires_at) VALUES (?, ?, ?)",
+                         (key, owner, now + ttl))
+            return True
+
+    def release(self, owner: str) -> None:
+        """Give up every slug lease and the heartbeat (named locks are kept until they expire)."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM sched_leases WHERE owner = ? AND slug NOT LIKE ?", (owner, LOCK_PREFIX + "%"))
+            conn.execute("DELETE FROM sched_workers WHERE owner = ?", (owner,))
+
+    def rate_share(self, owner: str, weight: float, ttl: float, now: Optional[float] = None) -> float:
+        """Heartbeat `owner`'s weight for `ttl` seconds; returns its share of the live total (0-1]."""
+        now = time.time() if now is None else now
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO rate_shares (owner, weight, expires_at) VALUES (?, ?, ?)",
+                         (owner, weight, now + ttl))
+            conn.execute("DELETE FROM rate_shares WHERE expires_at < ?", (now,))
+            total = conn.execute("SELECT SUM(weight) FROM rate_shares").fetchone()[0]
+        return weight / total if total else 1.0
+
+    def release_rate_share(self, owner: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM rate_shares WHERE owner = ?", (owner,))
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class RateShare:
+    """
+    Keeps a process's limiter at its share of the host-wide upstream quota.
+    Refreshes every `refresh` seconds; a process that stops heartbeating drops out after 3x that,
+    and until then the others run below quota, never above it.
+    """
+
+    def __init__(self, limiter: TokenBucket, weight: float, path: str = LEASE_DB_PATH, refresh: float = 10.0):
+        self.limiter = limiter
+        self.weight = weight
+        self.path = path
+        self.refresh = refresh
+        self.owner = make_worker_id()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._store: Optional[LeaseStore] = None
+
+    def update(self) -> float:
+        if self._store is None:
+            self._store = LeaseStore(self.path)
+        share = self._store.rate_share(self.owner, self.weight, ttl=3 * self.refresh)
+        if abs(share - self.limiter.share) > 1e-6:
+            print(f"[rate] {self.owner}: {share:.0%} of {self.limiter.quota_rate:g} req/s")
+            self.limiter.set_share(share)
+        return share
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh):
+            try:
+                self.update()
+            except sqlite3.Error as e:
+                print(f"[rate] share update failed: {e}")
+
+    def start(self) -> "RateShare":
+        """Take the share now (before any upstream call), then keep it fresh in a daemon thread."""
+        try:
+            self.update()
+        except sqlite3.Error as e:
+            print(f"[rate] share update failed: {e}")
+        self._thread = threading.Thread(target=self._run, name="rate-share", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._store is not None:
+            try:
+                self._store.release_rate_share(self.owner)
+            except sqlite3.Error:
+                pass
+            self._store.close()
@@ -0,0 +1,297 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (c) 2025 Danila Novik & Heorhi Shtsivel
+
+"""
+Minimal in-process metrics (counters, gauges, histograms) rendered in the Prometheus text format.
+
+Hot paths record into the module-level metrics below; GET /metrics renders them together with
+values read at scrape time from existing counters (stats cache, rate limiter) via collectors.
+Everything is thread-safe, so metrics can be recorded from executor and job threads.
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+from image_cache import image_cache
+from rate_limiter import upstream_limiter
+from resilience import upstream, STATE_VALUES
+from stats_cache import stats_cache
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; covers both quick HTTP calls and multi-minute crawls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the wall time of the `with` block (also when it raises)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+# a collector returns (name, kind, help, [(labels, value), ...]) for values owned elsewhere
+Sample = Tuple[Dict[str, str], float]
+Collected = Tuple[str, str, str, List[Sample]]
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], List[Collected]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], List[Collected]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                collected = collector()
+            except Exception as e:
+                print(f"[metrics] collector failed: {e}")
+                continue
+            for name, kind, help, samples in collected:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds", "API request latency until response headers, by route template.",
+    ("method", "route", "status"))
+
+upstream_requests = registry.counter(
+    "upstream_requests_total", "OpenSea API calls by endpoint type and HTTP status (or 'error').",
+    ("endpoint", "status"))
+upstream_request_seconds = registry.histogram(
+    "upstream_request_duration_seconds", "OpenSea API call latency by endpoint type.", ("endpoint",))
+upstream_rate_limited = registry.counter(
+    "upstream_rate_limited_total", "429 responses from the OpenSea API.", ("endpoint",))
+upstream_backoffs = registry.counter(
+    "upstream_backoffs_total", "Retries after a 429 or server error.", ("endpoint",))
+upstream_sleep_seconds = registry.counter(
+    "upstream_sleep_seconds_total",
+    "Time spent waiting before upstream calls: limiter (token wait + Retry-After pauses), backoff, pause.",
+    ("reason",))
+
+pipeline_stage_seconds = registry.histogram(
+    "pipeline_stage_duration_seconds", "Duration of each pipeline stage (fetch, filter, save).", ("stage",))
+pipeline_stage_items = registry.counter(
+    "pipeline_stage_items_total", "Items handled per pipeline stage.", ("stage",))
+
+scheduler_cycle_seconds = registry.histogram(
+    "scheduler_cycle_duration_seconds", "Duration of one scheduler cycle (fetch + store of one due batch).")
+scheduler_slugs_refreshed = registry.counter(
+    "scheduler_slugs_refreshed_total", "Slugs refreshed by the scheduler.")
+scheduler_slugs_per_second = registry.gauge(
+    "scheduler_slugs_per_second", "Slugs per second in the last scheduler cycle.")
+scheduler_tracked_slugs = registry.gauge(
+    "scheduler_tracked_slugs", "Slugs this process's scheduler is refreshing.")
+
+
+def _stats_cache_collector() -> List[Collected]:
+    s = stats_cache.stats()
+    return [
+        ("stats_cache_lookups_total", "counter", "Stats cache lookups by result.",
+         [({"result": "hit"}, s["hits"]), ({"result": "stale"}, s["stale_hits"]), ({"result": "miss"}, s["misses"])]),
+        ("stats_cache_hit_ratio", "gauge", "Share of stats cache lookups served from memory (fresh or stale).",
+         [({}, s["hit_rate"])]),
+        ("stats_cache_entries", "gauge", "Entries in the stats cache.", [({}, s["size"])]),
+        ("stats_cache_evictions_total", "counter", "LRU evictions from the stats cache.", [({}, s["evictions"])]),
+        ("stats_cache_refreshes_total", "counter", "Background refreshes of stale entries.", [({}, s["refreshes"])]),
+    ]
+
+
+def _rate_limiter_collector() -> List[Collected]:
+    s = upstream_limiter.stats()
+    return [
+        ("rate_limiter_granted_total", "counter", "Tokens granted by the upstream limiter, by priority.",
+         [({"priority": p}, n) for p, n in s["granted"].items()]),
+        ("rate_limiter_waiting", "gauge", "Callers waiting for a token, by priority.",
+         [({"priority": p}, n) for p, n in s["waiting"].items()]),
+        ("rate_limiter_penalties_total", "counter", "Limiter pauses after 429s.", [({}, s["penalties"])]),
+        ("rate_limiter_penalty_seconds_total", "counter", "Total length of limiter pauses.",
+         [({}, s["penalty_seconds"])]),
+    ]
+
+
+def _image_cache_collector() -> List[Collected]:
+    s = image_cache.stats()
+    return [
+        ("image_cache_lookups_total", "counter", "Thumbnail requests by result.",
+         [({"result": "hit"}, s["hits"]), ({"result": "miss"}, s["misses"])]),
+        ("image_cache_bytes", "gauge", "Bytes of thumbnails on disk.", [({}, s["bytes"])]),
+        ("image_cache_images", "gauge", "Images with thumbnails on disk.", [({}, s["images"])]),
+        ("image_cache_fetches_total", "counter", "Source images fetched and resized, by result.",
+         [({"result": "ok"}, s["fetched"]), ({"result": "error"}, s["failures"])]),
+        ("image_cache_evictions_total", "counter", "Images evicted to stay under the size limit.",
+         [({}, s["evictions"])]),
+    ]
+
+
+def _upstream_collector() -> List[Collected]:
+    s = upstream.stats()
+    endpoints, deadlines = s["endpoints"], s["deadlines"]
+    latency = {e: v["latency"] for e, v in endpoints.items()}
+    breakers = {e: v["breaker"] for e, v in endpoints.items()}
+    return [
+        ("upstream_hedges_total", "counter", "Duplicate upstream requests sent after the hedge delay.",
+         [({"endpoint": e}, s["hedges"]) for e, s in latency.items()]),
+        ("upstream_hedge_wins_total", "counter", "Hedged requests that answered before the original.",
+         [({"endpoint": e}, s["hedge_wins"]) for e, s in latency.items()]),
+        ("upstream_hedge_delay_seconds", "gauge", "Current hedge delay (latency percentile) per endpoint.",
+         [({"endpoint": e}, s["hedge_delay_ms"] / 1000) for e, s in latency.items() if s["hedge_delay_ms"] is not None]),
+        ("upstream_deadline_exceeded_total", "counter", "Upstream calls abandoned because the request deadline ran out.",
+         [({}, deadlines["exceeded"])]),
+        ("circuit_breaker_state", "gauge", "Circuit breaker state per endpoint: 0 closed, 1 half-open, 2 open.",
+         [({"endpoint": e}, STATE_VALUES[s["state"]]) for e, s in breakers.items()]),
+        ("circuit_breaker_opened_total", "counter", "Times the circuit breaker opened.",
+         [({"endpoint": e}, s["opened"]) for e, s in breakers.items()]),
+        ("circuit_breaker_rejected_total", "counter", "Upstream calls failed fast by an open circuit breaker.",
+         [({"endpoint": e}, s["rejected"]) for e, s in breakers.items()]),
+        ("circuit_breaker_served_cached_total", "counter", "Failed fetches answered from the cache while the breaker was open.",
+         [({"endpoint": e}, s["served_cached"]) for e, s in breakers.items()]),
+    ]
+
+
+registry.add_collector(_stats_cache_collector)
+registry.add_collector(_rate_limiter_collector)
+registry.add_collector(_image_cache_collector)
+registry.add_collector(_upstream_collector)
+
+
+def render() -> str:
+    return registry.render()
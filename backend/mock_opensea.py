@@ -0,0 +1,244 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (c) 2025 Danila Novik & Heorhi Shtsivel
+
+"""
+Local stand-in for the two OpenSea v2 endpoints this backend calls, for offline benchmarks.
+
+Serves `GET /api/v2/collections` (cursor pagination, market cap order, filtered by `chain`) and
+`GET /api/v2/collections/{slug}/stats` from payloads replayed from filtered_collections.csv.
+Beyond the seed rows, collections are cloned under new slugs with their numbers scaled by a
+random factor, so any number of collections can be served with realistic shapes and sizes.
+Latency (mean + jitter) and the share of requests answered with 429 + Retry-After are configurable.
+
+Run:
+    python mock_opensea.py --collections 1000 --latency 0.05 --rate-429 0.01
+and point the backend at it with OPENSEA_API_BASE=http://127.0.0.1:8100/api/v2
+"""
+import argparse
+import csv
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+SEED_CSV_PATH = "filtered_collections.csv"
+# OpenSea caps the collections page size at 100
+MAX_PAGE_LIMIT = 100
+
+# stats fields scaled when cloning a seed collection
+_SCALED_TOTAL = ("volume", "market_cap", "floor_price", "average_price")
+_SCALED_INTERVAL = ("volume", "volume_diff", "average_price")
+
+
+def load_seed(path: str = SEED_CSV_PATH) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """(general_info, stats) pairs from a CSV written by save_filtered_collections_csv."""
+    seed = []
+    with open(path, newline="", encoding="utf-8") as fh:
+        for rec in csv.DictReader(fh):
+            try:
+                seed.append((json.loads(rec["general_info"]), json.loads(rec["stats"])))
+            except (KeyError, TypeError, ValueError):
+                continue
+    if not seed:
+        raise ValueError(f"No usable rows in {path}")
+    return seed
+
+
+def _scaled_stats(stats: Dict[str, Any], factor: float) -> Dict[str, Any]:
+    out = json.loads(json.dumps(stats))
+    total = out.get("total") or {}
+    for field in _SCALED_TOTAL:
+        if isinstance(total.get(field), (int, float)):
+            total[field] *= factor
+    for it in out.get("intervals") or []:
+        for field in _SCALED_INTERVAL:
+            if isinstance(it.get(field), (int, float)):
+                it[field] *= factor
+    return out
+
+
+def make_dataset(n: int, seed_path: str = SEED_CSV_PATH, seed: int = 0,
+                 chains: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """
+    `n` collections (ordered by market cap, highest first) and their stats keyed by slug.
+    With `chains`, the collections are dealt round-robin to those chains (their contracts' `chain`).
+    """
+    rows = load_seed(seed_path)
+    rng = random.Random(seed)
+    collections: List[Tuple[float, Dict[str, Any]]] = []
+    stats_by_slug: Dict[str, Dict[str, Any]] = {}
+    for i in range(n):
+        info, stats = rows[i % len(rows)]
+        if i < len(rows):
+            slug, copy_stats = info["collection"], stats
+        else:
+            slug = f"{info['collection']}-{i // len(rows)}"
+            copy_stats = _scaled_stats(stats, rng.lognormvariate(0.0, 1.0))
+        copy_info = dict(info, collection=slug, opensea_url=f"https://opensea.io/collection/{slug}")
+        if chains:
+            chain = chains[i % len(chains)]
+            copy_info["contracts"] = [dict(c, chain=chain) for c in info.get("contracts") or []] or [{"chain": chain}]
+        stats_by_slug[slug] = copy_stats
+        collections.append(((copy_stats.get("total") or {}).get("market_cap") or 0.0, copy_info))
+    collections.sort(key=lambda pair: pair[0], reverse=True)
+    return [info for _, info in collections], stats_by_slug
+
+
+def collection_chain(collection: Dict[str, Any]) -> str:
+    contracts = collection.get("contracts") or []
+    return (contracts[0].get("chain") if contracts and isinstance(contracts[0], dict) else None) or "base"
+
+
+class MockOpenSea:
+
+    def __init__(self, collections: List[Dict[str, Any]], stats: Dict[str, Dict[str, Any]],
+                 latency: float = 0.0, jitter: float = 0.0, rate_429: float = 0.0, retry_after: float = 0.5,
+                 host: str = "127.0.0.1", port: int = 0, seed: int = 0):
+        self.collections = collections
+        self._by_chain: Dict[str, List[Dict[str, Any]]] = {}
+        for collection in collections:
+            self._by_chain.setdefault(collection_chain(collection), []).append(collection)
+        self.stats = stats
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._counts_lock = threading.Lock()
+        self.counts = {"pages": 0, "stats": 0, "not_found": 0, "rate_limited": 0}
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v2"
+
+    def _count(self, key: str) -> None:
+        with self._counts_lock:
+            self.counts[key] += 1
+
+    def _draw(self) -> Tuple[float, bool]:
+        with self._rng_lock:
+            delay = max(0.0, self._rng.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+            return delay, self._rng.random() < self.rate_429
+
+    def page(self, limit: int, cursor: Optional[str], chain: Optional[str] = None) -> Dict[str, Any]:
+        collections = self.collections if chain is None else self._by_chain.get(chain, [])
+        try:
+            offset = int(cursor) if cursor else 0
+        except ValueError:
+            offset = 0
+        limit = max(1, min(limit, MAX_PAGE_LIMIT))
+        end = offset + limit
+        return {
+            "collections": collections[offset:end],
+            "next": str(end) if end < len(collections) else "",
+        }
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive, like the real API, so the client connection pool matters
+            protocol_version = "HTTP/1.1"
+            # headers and body go out in separate writes; without TCP_NODELAY, delayed ACKs add ~40ms each
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                path = parts.path.rstrip("/").split("/")
+                delay, limited = mock._draw()
+                if delay:
+                    time.sleep(delay)
+                if limited:
+                    mock._count("rate_limited")
+                    self._send(429, {"detail": "rate limited"}, {"Retry-After": f"{mock.retry_after:g}"})
+                    return
+
+                # ["", "api", "v2", "collections", <slug>, "stats"]
+                if path[1:4] == ["api", "v2", "collections"] and len(path) == 4:
+                    query = parse_qs(parts.query)
+                    try:
+                        limit = int(query.get("limit", ["50"])[0])
+                    except ValueError:
+                        limit = 50
+                    mock._count("pages")
+                    self._send(200, mock.page(limit, query.get("cursor", [None])[0], query.get("chain", [None])[0]))
+                elif path[1:4] == ["api", "v2", "collections"] and len(path) == 6 and path[5] == "stats":
+                    stats = mock.stats.get(path[4])
+                    if stats is None:
+                        mock._count("not_found")
+                        self._send(404, {"errors": [f"collection {path[4]} not found"]})
+                    else:
+                        mock._count("stats")
+                        self._send(200, stats)
+                else:
+                    mock._count("not_found")
+                    self._send(404, {"errors": ["not found"]})
+
+        return Handler
+
+    def start(self) -> "MockOpenSea":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-opensea", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MockOpenSea":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the OpenSea API")
+    parser.add_argument("--collections", type=int, default=1000)
+    parser.add_argument("--seed-csv", default=SEED_CSV_PATH)
+    parser.add_argument("--chains", default="base", help="comma-separated chains the collections are spread over")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean response delay (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.01, help="stddev of the response delay (seconds)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+
+    collections, stats = make_dataset(args.collections, args.seed_csv, chains=args.chains.split(","))
+    mock = MockOpenSea(collections, stats, latency=args.latency, jitter=args.jitter, rate_429=args.rate_429,
+                       retry_after=args.retry_after, host=args.host, port=args.port)
+    with mock:
+        print(f"Serving {len(collections)} collections at {mock.url}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (c) 2025 Danila Novik & Heorhi Shtsivel
+
+"""
+Compact, slotted models for collection info and stats, parsed once from the raw API dicts.
+
+Only the fields the backend and the chart use are kept (descriptions, social links, contracts
+and the like are dropped), so a parsed collection costs a fraction of its raw dict, and
+to_dict() gives the slim JSON shape used by `format=slim` responses and slim CSVs. The slim
+dicts keep the API's key names ("collection", "name", "image_url", "opensea_url", "total",
+"intervals"), so every reader of the full format also reads the slim one.
+Pass keep_raw=True to keep the original payload on `.raw` when it is needed.
+"""
+import sys
+from typing import Any, Dict, Optional, Tuple, Union
+
+SLIM, FULL = "slim", "full"
+FORMATS = (FULL, SLIM)
+
+
+def _float(value: Any) -> Optional[float]:
+    try:
+        return None if value is None else float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _int(value: Any) -> Optional[int]:
+    try:
+        return None if value is None else int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# significant digits kept for floats in slim output: exact for prices quoted in ETH (e.g. 0.05197999),
+# drops only the float accumulation noise in volumes (7021.876650594605 -> 7021.8767)
+SLIM_DIGITS = 8
+
+
+def _compact(d: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: (float(f"{v:.{SLIM_DIGITS}g}") if isinstance(v, float) else v)
+            for k, v in d.items() if v is not None and v != ""}
+
+
+class CollectionInfo:
+    __slots__ = ("slug", "name", "image_url", "opensea_url", "category", "raw")
+
+    def __init__(self, slug: str, name: Optional[str] = None, image_url: Optional[str] = None,
+                 opensea_url: Optional[str] = None, category: Optional[str] = None,
+                 raw: Optional[Dict[str, Any]] = None):
+        self.slug = slug
+        self.name = name
+        self.image_url = image_url
+        self.opensea_url = opensea_url
+        self.category = category
+        self.raw = raw
+
+    @classmethod
+    def from_api(cls, data: Dict[str, Any], keep_raw: bool = False) -> "CollectionInfo":
+        slug = data.get("collection") or data.get("slug") or data.get("collection_slug")
+        category = data.get("category")
+        return cls(
+            slug=slug,
+            name=data.get("name"),
+            image_url=data.get("image_url"),
+            opensea_url=data.get("opensea_url"),
+            # a handful of distinct values shared by every collection
+            category=sys.intern(category) if isinstance(category, str) else None,
+            raw=data if keep_raw else None,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return _compact({
+            "collection": self.slug,
+            "name": self.name,
+            "image_url": self.image_url,
+            "opensea_url": self.opensea_url,
+            "category": self.category,
+        })
+
+
+class IntervalStats:
+    __slots__ = ("interval", "volume", "volume_diff", "volume_change", "sales", "sales_diff", "average_price")
+
+    def __init__(self, interval: str, volume: Optional[float] = None, volume_diff: Optional[float] = None,
+                 volume_change: Optional[float] = None, sales: Optional[int] = None,
+                 sales_diff: Optional[int] = None, average_price: Optional[float] = None):
+        self.interval = interval
+        self.volume = volume
+        self.volume_diff = volume_diff
+        self.volume_change = volume_change
+        self.sales = sales
+        self.sales_diff = sales_diff
+        self.average_price = average_price
+
+    @classmethod
+    def from_api(cls, data: Dict[str, Any]) -> "IntervalStats":
+        name = data.get("interval")
+        return cls(
+            interval=sys.intern(name) if isinstance(name, str) else name,
+            volume=_float(data.get("volume")),
+            volume_diff=_float(data.get("volume_diff")),
+            volume_change=_float(data.get("volume_change")),
+            sales=_int(data.get("sales")),
+            sales_diff=_int(data.get("sales_diff")),
+            average_price=_float(data.get("average_price")),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return _compact({name: getattr(self, name) for name in self.__slots__})
+
+
+class CollectionStats:
+    __slots__ = ("floor_price", "market_cap", "volume", "sales", "num_owners", "average_price", "intervals", "raw")
+
+    def __init__(self, floor_price: Optional[float] = None, market_cap: Optional[float] = None,
+                 volume: Optional[float] = None, sales: Optional[int] = None, num_owners: Optional[int] = None,
+                 average_price: Optional[float] = None, intervals: Tuple[IntervalStats, ...] = (),
+                 raw: Optional[Dict[str, Any]] = None):
+        self.floor_price = floor_price
+        self.market_cap = market_cap
+        self.volume = volume
+        self.sales = sales
+        self.num_owners = num_owners
+        self.average_price = average_price
+        self.intervals = intervals
+        self.raw = raw
+
+    @classmethod
+    def from_api(cls, data: Dict[str, Any], keep_raw: bool = False) -> "CollectionStats":
+        total = data.get("total") or {}
+        return cls(
+            floor_price=_float(total.get("floor_price")),
+            market_cap=_float(total.get("market_cap")),
+            volume=_float(total.get("volume")),
+            sales=_int(total.get("sales")),
+            num_owners=_int(total.get("num_owners")),
+            average_price=_float(total.get("average_price")),
+            intervals=tuple(IntervalStats.from_api(it) for it in data.get("intervals") or [] if isinstance(it, dict)),
+            raw=data if keep_raw else None,
+        )
+
+    def interval(self, name: str) -> Optional[IntervalStats]:
+        for it in self.intervals:
+            if it.interval == name:
+                return it
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        total = _compact({name: getattr(self, name) for name in
+                          ("volume", "sales", "num_owners", "market_cap", "floor_price", "average_price")})
+        return {"total": total, "intervals": [it.to_dict() for it in self.intervals]}
+
+
+Collection = Union[Dict[str, Any], CollectionInfo]
+
+
+def collection_slug(collection: Collection) -> Optional[str]:
+    if isinstance(collection, CollectionInfo):
+        return collection.slug
+    return collection.get("collection") or collection.get("slug") or collection.get("collection_slug")
+
+
+def collection_dict(collection: Collection, slim: bool = False) -> Dict[str, Any]:
+    """The JSON to emit for a raw dict or a parsed model: slim fields, or the raw payload when available."""
+    if isinstance(collection, CollectionInfo):
+        if not slim and collection.raw is not None:
+            return collection.raw
+        return collection.to_dict()
+    return CollectionInfo.from_api(collection).to_dict() if slim else collection
+
+
+def stats_dict(stats: Optional[Dict[str, Any]], slim: bool = False) -> Optional[Dict[str, Any]]:
+    if stats is None or not slim:
+        return stats
+    return CollectionStats.from_api(stats).to_dict()
+
@@ -4,10 +4,24 @@
 
 import os
 import time
+import contextvars
+import queue
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
-import json, csv
-from typing import List, Dict, Any, Optional
+from rate_limiter import upstream_limiter, parse_retry_after, INTERACTIVE, BACKGROUND
+from stats_cache import stats_cache
+import metrics
+import resilience
+from journal import journal, make_replay_session, REPLAY
+from models import Collection, collection_slug
+from export import export_filtered_collections
+import json
+from collections import deque
+from itertools import zip_longest
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
 
 load_dotenv()
 
@@ -17,94 +31,509 @@ def get_api_key() -> str:
     return api_key
 
 
-def make_session(api_key: str) -> requests.Session:
+# OpenSea API root; point it at a local stand-in (see mock_opensea.py) to run without network
+API_BASE = os.getenv("OPENSEA_API_BASE", "https://api.opensea.io/api/v2").rstrip("/")
+
+# max keep-alive connections kept open to the OpenSea API per session
+DEFAULT_POOL_SIZE = int(os.getenv("OPENSEA_POOL_SIZE", "16"))
+
+# upper bound for caller-supplied concurrency: each request in flight holds a thread (mostly waiting on the limiter)
+MAX_IN_FLIGHT = 32
+
+# largest max_total a merged multi-chain ranking by a stats field accepts: ranking costs up to one
+# stats request per merged collection, and at the default OPENSEA_RATE_LIMIT of 4/s 500 already take ~2 min
+MERGED_MAX_TOTAL = 500
+
+_shared_session: Optional[requests.Session] = None
+_shared_session_lock = threading.Lock()
+
+
+def make_session(api_key: str, pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
     s = requests.Session()
     s.headers.update({
         "Accept": "application/json",
         "X-API-KEY": api_key
     })
+    # size the keep-alive pool so concurrent stats requests reuse connections instead of reconnecting
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
     return s
 
 
-def fetch_collections(session: requests.Session,
-                      chain: str = "base",
-                      order_by: str = "market_cap",
-                      page_limit: int = 100,
-                      max_total: int = 1000,
-                      pause: float = 0.25) -> List[Dict[str, Any]]:
+def clamp_in_flight(max_in_flight: Optional[int], default: int = 8) -> int:
+    return min(max(1, int(max_in_flight or default)), MAX_IN_FLIGHT)
+
+
+def get_shared_session() -> requests.Session:
     """
-    Fetch up to `max_total` collections by paging the collections endpoint.
-    Returns list of collection objects as returned by the API.
+    Return the process-wide session shared by the API handlers and the scheduler.
+    Created lazily on first use; call close_shared_session() on shutdown.
     """
-    BASE_URL = "https://api.opensea.io/api/v2/collections"
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            # OPENSEA_REPLAY=1: answer everything from the response journal, no network
+            _shared_session = make_replay_session(journal) if REPLAY else make_session(get_api_key())
+        return _shared_session
+
+
+def close_shared_session() -> None:
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is not None:
+            _shared_session.close()
+            _shared_session = None
+
+
+def upstream_get(session: requests.Session, url: str, params: Optional[Dict[str, Any]] = None,
+                 priority: int = INTERACTIVE, endpoint: str = "other") -> requests.Response:
+    """
+    GET against the OpenSea API through the shared rate limiter.
+    A 429 pauses the limiter for the Retry-After duration, so every caller backs off, not just this one.
+    `endpoint` is the endpoint type used as the metrics label ("collections", "stats").
+    Successful responses are recorded in the response journal; replay sessions skip both.
+    The call honours the current request deadline and the endpoint's circuit breaker, and is hedged
+    with a duplicate request when it runs slower than usual (see resilience.py); it raises
+    resilience.DeadlineExceeded / CircuitOpenError, both requests.RequestException subclasses.
+    """
+    offline = getattr(session, "offline", False)
+
+    def send(timeout: float) -> requests.Response:
+        started = time.perf_counter()
+        try:
+            resp = session.get(url, params=params, timeout=timeout)
+        except requests.RequestException:
+            metrics.upstream_requests.inc(endpoint=endpoint, status="error")
+            raise
+        finally:
+            metrics.upstream_request_seconds.observe(time.perf_counter() - started, endpoint=endpoint)
+        metrics.upstream_requests.inc(endpoint=endpoint, status=str(resp.status_code))
+        return resp
+
+    if offline:
+        return send(resilience.UPSTREAM_TIMEOUT)
+
+    breaker = resilience.upstream.breaker(endpoint)
+    breaker.before_call()
+    try:
+        waited = time.perf_counter()
+        left = resilience.remaining()
+        acquired = upstream_limiter.acquire(priority, timeout=None if left is None else max(0.0, left))
+        metrics.upstream_sleep_seconds.inc(time.perf_counter() - waited, reason="limiter")
+        if not acquired:
+            resilience.check_deadline("rate limiter token")
+        resp = resilience.hedged_call(send, resilience.upstream.tracker(endpoint),
+                                      lambda: upstream_limiter.acquire(priority, timeout=0))
+    except resilience.DeadlineExceeded:
+        # our own budget ran out; says nothing about the upstream's health
+        breaker.record(None)
+        raise
+    except requests.RequestException:
+        breaker.record(False)
+        raise
+    except BaseException:
+        breaker.record(None)
+        raise
+    breaker.record(resp.status_code < 500)
+
+    journal.record_response(url, params, resp)
+    if resp.status_code == 429:
+        metrics.upstream_rate_limited.inc(endpoint=endpoint)
+        retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+        if retry_after is not None:
+            upstream_limiter.penalize(retry_after)
+    return resp
+
+
+def _read_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    # write-then-rename so a crash never leaves a half-written checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(checkpoint, fh)
+    os.replace(tmp_path, path)
+
+
+def iter_collection_pages(session: requests.Session,
+                          chain: str = "base",
+                          order_by: str = "market_cap",
+                          page_limit: int = 100,
+                          max_total: int = 1000,
+                          pause: float = 0.25,
+                          priority: int = INTERACTIVE,
+                          checkpoint_path: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Page through the collections endpoint, yielding each page (a list of collection objects) as it arrives.
+    If `checkpoint_path` is given, the next cursor is saved there after each page is consumed, and a later
+    call with the same chain/order_by/page_limit resumes from it instead of page one. The checkpoint is
+    removed once the crawl completes. Request errors are raised (the checkpoint is kept for the rerun).
+    A comma-separated `chain` ("base,ethereum") crawls every chain concurrently and yields the merged
+    ranking once all of them are done (see iter_multichain_pages).
+    """
+    chains = parse_chains(chain)
+    if len(chains) > 1:
+        yield from iter_multichain_pages(session, chains, order_by=order_by, page_limit=page_limit,
+                                         max_total=max_total, pause=pause, priority=priority,
+                                         checkpoint_path=checkpoint_path)
+        return
+
+    BASE_URL = f"{API_BASE}/collections"
     params = {
         "chain": chain,
         "order_by": order_by,
         "limit": page_limit
     }
 
-    all_collections: List[Dict[str, Any]] = []
     next_cursor: Optional[str] = None
+    fetched = 0
+    if checkpoint_path:
+        checkpoint = _read_checkpoint(checkpoint_path)
+        if checkpoint and checkpoint.get("params") == params and checkpoint.get("cursor"):
+            next_cursor = checkpoint["cursor"]
+            fetched = int(checkpoint.get("fetched", 0))
+            print(f"Resuming collections crawl from checkpoint ({fetched} already fetched)")
+
     backoff = 1.0
+    first_page = True
+    # time spent fetching, excluding time suspended at `yield` while the consumer works
+    busy = 0.0
+    resumed = time.perf_counter()
+    fetched_here = 0
 
-    while len(all_collections) < max_total:
-        if next_cursor:
-            params["cursor"] = next_cursor
-        try:
-            resp = session.get(BASE_URL, params=params, timeout=15)
-        except requests.RequestException as e:
-            print("Request failed:", e)
-            break
+    try:
+        while fetched < max_total:
+            if next_cursor:
+                params["cursor"] = next_cursor
+            if not first_page:
+                time.sleep(pause)
+                metrics.upstream_sleep_seconds.inc(pause, reason="pause")
+
+            resp = upstream_get(session, BASE_URL, params=params, priority=priority, endpoint="collections")
+
+            if resp.status_code == 429:
+                # rate limited — exponential backoff unless the limiter was already paused via Retry-After
+                metrics.upstream_backoffs.inc(endpoint="collections")
+                if not resp.headers.get("Retry-After"):
+                    upstream_limiter.penalize(backoff)
+                backoff = min(backoff * 2, 60)
+                continue
 
-        if resp.status_code == 429:
-            # rate limited — exponential backoff
-            time.sleep(backoff)
-            backoff = min(backoff * 2, 60)
-            continue
+            resp.raise_for_status()
+            data = resp.json()
+            first_page = False
 
-        resp.raise_for_status()
-        data = resp.json()
+            page_collections = data.get("collections") or data.get("results") or []
+            if not page_collections:
+                break
 
-        page_collections = data.get("collections") or data.get("results") or []
-        if not page_collections:
-            break
+            # stop if we've reached the cap
+            page_collections = page_collections[:max_total - fetched]
+            fetched += len(page_collections)
+            fetched_here += len(page_collections)
 
-        all_collections.extend(page_collections)
-        # stop if we've reached the cap
-        if len(all_collections) >= max_total:
-            all_collections = all_collections[:max_total]
-            break
+            # try to read cursor/next from known fields
+            next_cursor = data.get("next") or data.get("cursor") or data.get("next_cursor") or data.get("continuation")
+
+            busy += time.perf_counter() - resumed
+            yield page_collections
+            resumed = time.perf_counter()
 
-        # try to read cursor/next from known fields
-        next_cursor = data.get("next") or data.get("cursor") or data.get("next_cursor") or data.get("continuation")
-        if not next_cursor:
+            if checkpoint_path:
+                _write_checkpoint(checkpoint_path, {"params": {k: v for k, v in params.items() if k != "cursor"},
+                                                    "cursor": next_cursor, "fetched": fetched})
+            if not next_cursor:
+                break
+
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+    finally:
+        busy += time.perf_counter() - resumed
+        metrics.pipeline_stage_seconds.observe(busy, stage="fetch")
+        metrics.pipeline_stage_items.inc(fetched_here, stage="fetch")
+
+
+# order_by values of the collections endpoint -> (stats section, field) that ranks collections across chains
+ORDER_BY_STATS = {
+    "market_cap": ("total", "market_cap"),
+    "num_owners": ("total", "num_owners"),
+    "seven_day_volume": ("seven_day", "volume"),
+    "one_day_change": ("one_day", "volume_change"),
+    "seven_day_change": ("seven_day", "volume_change"),
+}
+
+
+def parse_chains(chain: str) -> List[str]:
+    """"base, ethereum" -> ["base", "ethereum"] (order kept, blanks and duplicates dropped)."""
+    return list(dict.fromkeys(c.strip() for c in (chain or "").split(",") if c.strip()))
+
+
+def stats_rank_value(stats: Optional[Dict[str, Any]], order_by: str) -> Optional[float]:
+    """The stats value a collection is ranked by for `order_by` (None if unknown or missing)."""
+    if order_by not in ORDER_BY_STATS or not isinstance(stats, dict):
+        return None
+    section, field = ORDER_BY_STATS[order_by]
+    if section == "total":
+        value = (stats.get("total") or {}).get(field)
+    else:
+        value = next((it.get(field) for it in stats.get("intervals") or []
+                      if isinstance(it, dict) and it.get("interval") == section), None)
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def rank_merged_collections(session: requests.Session,
+                            per_chain: List[List[Dict[str, Any]]],
+                            order_by: str = "market_cap",
+                            max_total: int = 1000,
+                            max_in_flight: int = 8,
+                            priority: int = INTERACTIVE) -> List[Dict[str, Any]]:
+    """
+    Merge per-chain collection lists (each already in `order_by` order) into one ranking of at most `max_total`.
+    Collections are ranked by the stats value `order_by` maps to (ORDER_BY_STATS), in a k-way merge that
+    fetches those values a small window at a time per chain, only while that chain's head can still make the
+    ranking, and never more than the ranking still needs. The cost is about one stats request per merged
+    collection (up to `max_total` plus, per chain, one window that does not place): minutes at the default
+    rate limit once `max_total` reaches the hundreds, hence MERGED_MAX_TOTAL. Cached stats cost nothing,
+    and filtering the merged list afterwards reuses them.
+    A collection without that value keeps the value of the one above it on its chain, so each chain's own
+    order is preserved; ties go to the chain listed first. Orders with no stats counterpart (e.g.
+    created_date) interleave the chains rank by rank. A collection listed on several chains is kept once.
+    """
+    seen = set()
+    lists: List[List[Dict[str, Any]]] = []
+    for collections in per_chain:
+        unique = []
+        for collection in collections:
+            slug = get_collection_slug(collection)
+            if slug and slug not in seen:
+                seen.add(slug)
+                unique.append(collection)
+        lists.append(unique)
+
+    if order_by not in ORDER_BY_STATS:
+        return [c for rank in zip_longest(*lists) for c in rank if c is not None][:max_total]
+
+    window = clamp_in_flight(max_in_flight) * 2
+    # per chain: rank values of the prefix fetched so far, the value carried over gaps, and the merge position
+    values: List[List[float]] = [[] for _ in lists]
+    # until a chain's first known value, its collections stay on top, in their own order
+    carried = [float("inf")] * len(lists)
+    pos = [0] * len(lists)
+    merged: List[Dict[str, Any]] = []
+    while len(merged) < max_total:
+        # every chain whose head has no value yet gets its next window fetched, all in one concurrent batch;
+        # no chain can place more than the collections still missing
+        size = min(window, max_total - len(merged))
+        need = {i: lists[i][pos[i]:pos[i] + size] for i in range(len(lists))
+                if pos[i] == len(values[i]) and pos[i] < len(lists[i])}
+        if need:
+            slugs = [get_collection_slug(c) for batch in need.values() for c in batch]
+            fetched = {slug: stats_rank_value(stats, order_by) for slug, stats in
+                       iter_collection_stats(session, slugs, max_in_flight=max_in_flight, priority=priority)}
+            for i, batch in need.items():
+                for collection in batch:
+                    value = fetched.get(get_collection_slug(collection))
+                    if value is not None:
+                        carried[i] = value
+                    values[i].append(carried[i])
+        heads = [i for i in range(len(lists)) if pos[i] < len(lists[i])]
+        if not heads:
             break
+        best = max(heads, key=lambda i: (values[i][pos[i]], -i))
+        merged.append(lists[best][pos[best]])
+        pos[best] += 1
+    return merged
+
+
+def iter_multichain_pages(session: requests.Session,
+                          chains: List[str],
+                          order_by: str = "market_cap",
+                          page_limit: int = 100,
+                          max_total: int = 1000,
+                          pause: float = 0.25,
+                          priority: int = INTERACTIVE,
+                          checkpoint_path: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Crawl several chains at once, one thread per chain with its own cursor, backoff and pauses (all under
+    the shared rate limiter), so the crawl takes about as long as the slowest chain rather than the sum.
+    Each chain is crawled up to `max_total`, since the global top may come from one chain alone; the merged
+    ranking (rank_merged_collections) is then yielded in pages of `page_limit`. A checkpoint is kept per
+    chain (`<checkpoint_path>.<chain>`). An HTTP error on any chain is raised.
+    """
+    with ThreadPoolExecutor(max_workers=len(chains)) as executor:
+        futures = [resilience.submit_in_context(executor, fetch_collections, session, chain, order_by, page_limit, max_total, pause, priority,
+                                                f"{checkpoint_path}.{chain}" if checkpoint_path else None)
+                   for chain in chains]
+        per_chain = [future.result() for future in futures]
+    merged = rank_merged_collections(session, per_chain, order_by=order_by, max_total=max_total, priority=priority)
+    for i in range(0, len(merged), page_limit):
+        yield merged[i:i + page_limit]
 
-        time.sleep(pause)
+
+_PREFETCH_ITEM, _PREFETCH_ERROR, _PREFETCH_DONE = range(3)
+
+
+def prefetch_iter(iterable: Iterable[Any], depth: int = 1) -> Iterator[Any]:
+    """
+    Run `iterable` in a background thread, keeping up to `depth` items ready ahead of the consumer.
+    Used to load the next collections page while the current one is being filtered.
+    Exceptions from the producer are re-raised in the consumer.
+    """
+    q: queue.Queue = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in iterable:
+                if not put((_PREFETCH_ITEM, item)):
+                    return
+        except BaseException as e:
+            put((_PREFETCH_ERROR, e))
+            return
+        put((_PREFETCH_DONE, None))
+
+    # the producer keeps the consumer's context, so upstream calls still see the request deadline
+    threading.Thread(target=contextvars.copy_context().run, args=(produce,), daemon=True).start()
+    try:
+        while True:
+            kind, value = q.get()
+            if kind == _PREFETCH_DONE:
+                return
+            if kind == _PREFETCH_ERROR:
+                raise value
+            yield value
+    finally:
+        stop.set()
+
+
+def fetch_collections(session: requests.Session,
+                      chain: str = "base",
+                      order_by: str = "market_cap",
+                      page_limit: int = 100,
+                      max_total: int = 1000,
+                      pause: float = 0.25,
+                      priority: int = INTERACTIVE,
+                      checkpoint_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Fetch up to `max_total` collections by paging the collections endpoint.
+    Returns list of collection objects as returned by the API.
+    `priority` is the rate limiter class (scheduler refreshes pass BACKGROUND).
+    With `checkpoint_path`, an interrupted crawl can be resumed (see iter_collection_pages);
+    the resumed call returns only the collections fetched after the checkpoint.
+    `chain` may list several chains ("base,ethereum"): they are crawled concurrently and merged into
+    one ranking by `order_by`.
+    """
+    all_collections: List[Dict[str, Any]] = []
+    try:
+        for page in iter_collection_pages(session, chain=chain, order_by=order_by, page_limit=page_limit,
+                                          max_total=max_total, pause=pause, priority=priority,
+                                          checkpoint_path=checkpoint_path):
+            all_collections.extend(page)
+    except requests.HTTPError:
+        raise
+    except requests.RequestException as e:
+        print(f"Request failed after {len(all_collections)} collections:", e)
+        if checkpoint_path:
+            print(f"Crawl can be resumed from checkpoint {checkpoint_path}")
 
     return all_collections
 
 
+# per-slug outcome of a stats fetch, as HTTP status codes (4xx from OpenSea other than 429 are passed through)
+STATS_OK = 200
+STATS_RATE_LIMITED = 429
+STATS_UPSTREAM_ERROR = 502
+STATS_UNAVAILABLE = 503  # circuit breaker open
+STATS_TIMEOUT = 504
+
+
 def fetch_collection_stats(session: requests.Session,
                            collection_slug: str,
                            pause: float = 0.05,
-                           max_retries: int = 4) -> Optional[Dict[str, Any]]:
+                           max_retries: int = 4,
+                           priority: int = INTERACTIVE,
+                           use_cache: bool = True,
+                           errors: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
     """
     Fetch stats for a single collection slug. Returns JSON dict or None on failure.
+    Served from `stats_cache` when possible: fresh entries return immediately, stale ones are
+    returned while one background refresh runs. Pass use_cache=False to always hit the API
+    (the fresh result is still written to the cache).
+    If `errors` is given, a failed fetch stores its STATS_* status there under the slug.
+    While the stats circuit breaker is not closed, a failed fetch falls back to the cached entry of any age.
     """
-    url = f"https://api.opensea.io/api/v2/collections/{collection_slug}/stats"
+    if not use_cache:
+        stats = _fetch_collection_stats_uncached(session, collection_slug, max_retries, priority, errors)
+        stats_cache.put(collection_slug, stats)
+        return stats
+    stats = stats_cache.get_or_fetch(
+        collection_slug,
+        lambda: _fetch_collection_stats_uncached(session, collection_slug, max_retries, priority, errors),
+        refresh=lambda: _fetch_collection_stats_uncached(session, collection_slug, max_retries, BACKGROUND),
+    )
+    if stats is None:
+        breaker = resilience.upstream.breaker("stats")
+        cached = stats_cache.peek(collection_slug) if breaker.state != resilience.CLOSED else None
+        if cached is not None:
+            breaker.count_served_cached()
+            if errors is not None:
+                errors.pop(collection_slug, None)
+            return cached[0]
+    return stats
+
+
+def _fetch_collection_stats_uncached(session: requests.Session,
+                                     collection_slug: str,
+                                     max_retries: int = 4,
+                                     priority: int = INTERACTIVE,
+                                     errors: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
+    url = f"{API_BASE}/collections/{collection_slug}/stats"
     backoff = 1.0
+    failure = STATS_UPSTREAM_ERROR
 
     for attempt in range(max_retries):
         try:
-            resp = session.get(url, timeout=15)
+            resp = upstream_get(session, url, priority=priority, endpoint="stats")
+        except resilience.DeadlineExceeded as e:
+            print(f"Stats request for {collection_slug} gave up: {e}")
+            if errors is not None:
+                errors[collection_slug] = STATS_TIMEOUT
+            return None
+        except resilience.CircuitOpenError:
+            if errors is not None:
+                errors[collection_slug] = STATS_UNAVAILABLE
+            return None
         except requests.RequestException as e:
             print(f"Stats request failed for {collection_slug}: {e}")
+            if errors is not None:
+                errors[collection_slug] = STATS_UPSTREAM_ERROR
             return None
 
         if resp.status_code == 429:
-            time.sleep(backoff)
+            metrics.upstream_backoffs.inc(endpoint="stats")
+            if not resp.headers.get("Retry-After"):
+                upstream_limiter.penalize(backoff)
             backoff = min(backoff * 2, 60)
+            failure = STATS_RATE_LIMITED
             continue
 
         try:
@@ -114,20 +543,157 @@ def fetch_collection_stats(session: requests.Session,
             print(f"HTTP error for {collection_slug}: {e} (status {resp.status_code})")
             # if client error (4xx) other than 429 — don't retry
             if 400 <= resp.status_code < 500 and resp.status_code != 429:
+                if errors is not None:
+                    errors[collection_slug] = resp.status_code
                 return None
-            time.sleep(backoff)
+            metrics.upstream_backoffs.inc(endpoint="stats")
+            try:
+                resilience.sleep_within_deadline(backoff)
+            except resilience.DeadlineExceeded:
+                if errors is not None:
+                    errors[collection_slug] = STATS_TIMEOUT
+                return None
+            metrics.upstream_sleep_seconds.inc(backoff, reason="backoff")
             backoff = min(backoff * 2, 60)
+            failure = STATS_UPSTREAM_ERROR
 
     # last attempt failed
+    if errors is not None:
+        errors[collection_slug] = failure
     return None
 
 
-def build_filtered_collections(session: requests.Session,
-                               collections: List[Dict[str, Any]],
-                               interval: str = "1d",
-                               vol_thresh: float = 0.001,
-                               mcap_thresh: float = 0.001,
-                               max_results: int = 100) -> Dict[str, Dict[str, Any]]:
+# input interval spellings -> API interval names
+INTERVAL_ALIASES = {
+    "1d": "one_day",
+    "1day": "one_day",
+    "one_day": "one_day",
+    "7d": "seven_day",
+    "7day": "seven_day",
+    "one_week": "seven_day",
+    "seven_day": "seven_day",
+    "30d": "thirty_day",
+    "30day": "thirty_day",
+    "thirty_day": "thirty_day"
+}
+
+
+def normalize_interval(interval: str) -> str:
+    return INTERVAL_ALIASES.get(interval.lower(), interval.lower())
+
+
+def get_collection_slug(collection: Collection) -> Optional[str]:
+    """Slug of a raw collection dict or a models.CollectionInfo."""
+    return collection_slug(collection)
+
+
+def extract_floor_price(stats: Optional[Dict[str, Any]]) -> Optional[float]:
+    """Floor price from a stats response (`total.floor_price`), or None if missing/invalid."""
+    if not isinstance(stats, dict):
+        return None
+    floor = (stats.get("total") or {}).get("floor_price")
+    if floor is None:
+        floor = stats.get("floor_price")
+    if floor is None:
+        floor = (stats.get("stats") or {}).get("floor_price")
+    try:
+        return float(floor) if floor is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def iter_collection_stats(session: requests.Session,
+                          slugs: Iterable[str],
+                          max_in_flight: int = 8,
+                          priority: int = INTERACTIVE,
+                          use_cache: bool = True) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+    """
+    Fetch stats for many slugs with at most `max_in_flight` requests running at once.
+    Yields (slug, stats_or_None) in the same order as `slugs`.
+    Closing the generator early (e.g. `break` in the caller) cancels work that has not started yet.
+    """
+    max_in_flight = clamp_in_flight(max_in_flight)
+    executor = ThreadPoolExecutor(max_workers=max_in_flight)
+    pending: deque = deque()
+    slug_iter = iter(slugs)
+
+    def submit_next() -> bool:
+        for slug in slug_iter:
+            pending.append((slug, resilience.submit_in_context(executor, fetch_collection_stats, session, slug,
+                                                               priority=priority, use_cache=use_cache)))
+            return True
+        return False
+
+    try:
+        # keep a small queue beyond the worker count so workers never idle between yields
+        while len(pending) < max_in_flight * 2 and submit_next():
+            pass
+        while pending:
+            slug, future = pending.popleft()
+            try:
+                stats = future.result()
+            except Exception as e:
+                print(f"Stats request failed for {slug}: {e}")
+                stats = None
+            submit_next()
+            yield slug, stats
+    finally:
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_stats_as_completed(session: requests.Session,
+                            slugs: Iterable[str],
+                            max_in_flight: int = 8,
+                            timeout: Optional[float] = None,
+                            priority: int = INTERACTIVE) -> Iterator[Tuple[str, int, Optional[Dict[str, Any]]]]:
+    """
+    Fetch stats for many slugs concurrently and yield (slug, status, stats) as each one finishes.
+    `status` is STATS_OK, or the slug's own failure status (404, 429, 502) with stats None, so one
+    bad slug never fails the rest. Slugs still unfinished after `timeout` seconds are yielded with
+    STATS_TIMEOUT; queued ones are cancelled, those already in flight finish in the background and
+    still fill the stats cache.
+    """
+    deadline = None if timeout is None else time.monotonic() + max(0.0, timeout)
+    errors: Dict[str, int] = {}
+    executor = ThreadPoolExecutor(max_workers=clamp_in_flight(max_in_flight))
+    futures = {resilience.submit_in_context(executor, fetch_collection_stats, session, slug,
+                                            priority=priority, errors=errors): slug
+               for slug in dict.fromkeys(slugs)}
+    pending = set(futures)
+    try:
+        while pending:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                slug = futures[future]
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    print(f"Stats request failed for {slug}: {e}")
+                    stats = None
+                if stats is not None:
+                    yield slug, STATS_OK, stats
+                else:
+                    # no recorded reason when the fetch was shared with another caller's in-flight request
+                    yield slug, errors.get(slug, STATS_UPSTREAM_ERROR), None
+        for future in pending:
+            yield futures[future], STATS_TIMEOUT, None
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_filtered_collections(session: requests.Session,
+                              collections: Iterable[Dict[str, Any]],
+                              interval: str = "1d",
+                              vol_thresh: float = 0.001,
+                              mcap_thresh: float = 0.001,
+                              max_results: int = 100,
+                              max_in_flight: int = 8,
+                              progress: Optional[Dict[str, int]] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
     """
     From `collections` list, fetch fresh stats and keep those passing thresholds **based only on the chosen interval**.
     Interval can be provided as "1d", "7d", "30d" or as API interval names "one_day", "seven_day", "thirty_day".
@@ -135,119 +701,139 @@ def build_filtered_collections(session: requests.Session,
     Filtering logic:
       - require interval.volume > vol_thresh
       - if interval.average_price exists, require average_price > mcap_thresh (otherwise ignore mcap_thresh)
-    Returns a dict mapping slug -> stats_json.
+    `collections` may be any iterable (e.g. a stream of pages flattened from iter_collection_pages),
+    so filtering starts before the crawl has finished.
+    Stats are fetched concurrently (`max_in_flight` requests at once) but evaluated in input order,
+    so the result is the same as a sequential scan; outstanding requests are cancelled once
+    `max_results` collections have been accepted.
+    Yields (slug, stats_json) for each accepted collection as soon as it passes the thresholds.
+    If a `progress` dict is given, its "slugs_checked" / "slugs_accepted" counters are kept up to date.
     """
-    filtered: Dict[str, Dict[str, Any]] = {}
     counter = 0
+    if progress is None:
+        progress = {}
+    progress.setdefault("slugs_checked", 0)
+    progress.setdefault("slugs_accepted", 0)
+
+    target_interval = normalize_interval(interval)
+
+    slugs = (slug for slug in (get_collection_slug(c) for c in collections) if slug)
+    stats_iter = iter_collection_stats(session, slugs, max_in_flight=max_in_flight)
+    # time spent filtering (stats fan-out included), excluding time suspended at `yield`
+    busy = 0.0
+    resumed = time.perf_counter()
+    checked = 0
+    try:
+        for collection_slug, stats in stats_iter:
+            progress["slugs_checked"] += 1
+            checked += 1
+            if not stats:
+                continue
 
-    # normalize input interval to API interval names
-    interval_map = {
-        "1d": "one_day",
-        "1day": "one_day",
-        "one_day": "one_day",
-        "7d": "seven_day",
-        "7day": "seven_day",
-        "one_week": "seven_day",
-        "seven_day": "seven_day",
-        "30d": "thirty_day",
-        "30day": "thirty_day",
-        "thirty_day": "thirty_day"
-    }
-    target_interval = interval_map.get(interval.lower(), interval.lower())
-
-    for collection in collections:
-        collection_slug = collection.get("collection") or collection.get("slug") or collection.get("collection_slug")
-        if not collection_slug:
-            continue
-
-        stats = fetch_collection_stats(session, collection_slug)
-        if not stats:
-            continue
-
-        intervals = stats.get("intervals")
-        if not isinstance(intervals, list):
-            # no interval data — skip as per requirement to use only intervals
-            continue
-
-        # find the matching interval dict
-        matched = None
-        for it in intervals:
-            if not isinstance(it, dict):
+            intervals = stats.get("intervals")
+            if not isinstance(intervals, list):
+                # no interval data — skip as per requirement to use only intervals
                 continue
-            if it.get("interval") == target_interval:
-                matched = it
-                break
 
-        if not matched:
-            # requested interval not present — skip
-            continue
+            # find the matching interval dict
+            matched = None
+            for it in intervals:
+                if not isinstance(it, dict):
+                    continue
+                if it.get("interval") == target_interval:
+                    matched = it
+                    break
+
+            if not matched:
+                # requested interval not present — skip
+                continue
 
-        # read required fields from the matched interval (only what actually exists)
-        try:
-            volume = float(matched.get("volume", 0.0))
-        except (TypeError, ValueError):
-            volume = 0.0
-
-        avg_price_raw = matched.get("average_price")
-        average_price: Optional[float]
-        if avg_price_raw is None:
-            average_price = None
-        else:
+            # read required fields from the matched interval (only what actually exists)
             try:
-                average_price = float(avg_price_raw)
+                volume = float(matched.get("volume", 0.0))
             except (TypeError, ValueError):
-                average_price = None
+                volume = 0.0
 
-        # apply filters: must pass volume threshold; average_price must pass mcap_thresh if present
-        if volume > vol_thresh and (average_price is None or average_price > mcap_thresh):
-            filtered[collection_slug] = stats
-            counter += 1
-            print(
-                f"Accepted {collection_slug}: interval={target_interval} volume={volume} average_price={average_price} ({counter}/{max_results})")
-            if counter >= max_results:
-                break
+            avg_price_raw = matched.get("average_price")
+            average_price: Optional[float]
+            if avg_price_raw is None:
+                average_price = None
+            else:
+                try:
+                    average_price = float(avg_price_raw)
+                except (TypeError, ValueError):
+                    average_price = None
+
+            # apply filters: must pass volume threshold; average_price must pass mcap_thresh if present
+            if volume > vol_thresh and (average_price is None or average_price > mcap_thresh):
+                counter += 1
+                progress["slugs_accepted"] += 1
+                print(
+                    f"Accepted {collection_slug}: interval={target_interval} volume={volume} average_price={average_price} ({counter}/{max_results})")
+                busy += time.perf_counter() - resumed
+                yield collection_slug, stats
+                resumed = time.perf_counter()
+                if counter >= max_results:
+                    break
+    finally:
+        # cancels requests that are still queued
+        stats_iter.close()
+        busy += time.perf_counter() - resumed
+        metrics.pipeline_stage_seconds.observe(busy, stage="filter")
+        metrics.pipeline_stage_items.inc(checked, stage="filter")
 
-        time.sleep(0.05)
 
-    return filtered
+def build_filtered_collections(session: requests.Session,
+                               collections: Iterable[Dict[str, Any]],
+                               interval: str = "1d",
+                               vol_thresh: float = 0.001,
+                               mcap_thresh: float = 0.001,
+                               max_results: int = 100,
+                               max_in_flight: int = 8,
+                               progress: Optional[Dict[str, int]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Collect iter_filtered_collections into a dict mapping slug -> stats_json (see it for the filtering rules).
+    """
+    return dict(iter_filtered_collections(session, collections, interval=interval, vol_thresh=vol_thresh,
+                                          mcap_thresh=mcap_thresh, max_results=max_results,
+                                          max_in_flight=max_in_flight, progress=progress))
 
 
-def save_filtered_collections_csv(all_collections, filtered_collections,
-                                  filename: str = "filtered_collections.csv") -> None:
+def save_filtered_collections(all_collections, filtered_collections,
+                              filename: str = "filtered_collections.csv", slim: bool = False,
+                              fmt: Optional[str] = None) -> Optional[int]:
     """
-    Saves filtered_collections to CSV with columns: general_info, stats.
+    Saves filtered_collections as CSV (columns collection_slug, general_info, stats), NDJSON or Parquet;
+    `fmt` defaults to the one matching the file extension (see export.py).
+    Returns the rows written, or None if the file could not be written (the previous file is kept).
     Supports:
-      - filtered_collections as dict: slug -> stats_obj
+      - filtered_collections as dict: slug -> stats_obj, or an iterable of (slug, stats) pairs
       - filtered_collections as iterable: list of slugs (str) or list of dict objects (which may contain a slug)
-    For each entry, tries to find the original in all_collections by slug/collection/collection_slug.
-    general_info — JSON with fields slug, name, description (if found).
+    Each entry is matched to its collection in all_collections through a slug index, whatever the order.
+    general_info — JSON of the collection (just its slug if it is not in all_collections).
     stats — JSON with statistics (if available).
+    all_collections may hold raw dicts or models.CollectionInfo. With slim=True only the fields the chart
+    and the backend read are written (see models.py), which makes the file several times smaller.
+    The file is replaced atomically, so readers never see a partly written export.
     """
-
-    rows_written = 0
+    started = time.perf_counter()
     try:
-        with open(filename, "w", newline="", encoding="utf-8") as fh:
-            writer = csv.DictWriter(fh, fieldnames=["collection_slug", "general_info", "stats"])
-            writer.writeheader()
-
-            counter = 0
-
-            for collection_slug, info in filtered_collections.items():
-
-                while collection_slug != all_collections[counter]["collection"]:
-                    print(f"collection_slug: {collection_slug}, now: {all_collections[counter]['collection']}")
-                    counter += 1
-
-                gi_json = json.dumps(all_collections[counter], ensure_ascii=False)
-                stats_json = json.dumps(info, ensure_ascii=False)
-
-                writer.writerow({"collection_slug": collection_slug, "general_info": gi_json, "stats": stats_json})
-                rows_written += 1
+        rows_written = export_filtered_collections(all_collections, filtered_collections, filename, fmt=fmt, slim=slim)
     except Exception as e:
-        print(f"Failed to write CSV {filename}: {e}")
-        return
+        print(f"Failed to write {filename}: {e}")
+        return None
+    finally:
+        metrics.pipeline_stage_seconds.observe(time.perf_counter() - started, stage="save")
 
+    metrics.pipeline_stage_items.inc(rows_written, stage="save")
     print(f"Wrote {rows_written} rows to {filename}")
+    return rows_written
+
+
+def save_filtered_collections_csv(all_collections, filtered_collections,
+                                  filename: str = "filtered_collections.csv", slim: bool = False) -> Optional[int]:
+    """save_filtered_collections that always writes CSV, whatever the file extension."""
+    return save_filtered_collections(all_collections, filtered_collections, filename, slim=slim, fmt="csv")
 
 
 def main():
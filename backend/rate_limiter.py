@@ -0,0 +1,174 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (c) 2025 Danila Novik & Heorhi Shtsivel
+
+"""
+Process-wide token bucket for outbound OpenSea API calls.
+
+Every request in opensea_tools.py takes a token from `upstream_limiter` before it is sent,
+so user-triggered endpoints and the scheduler share one request budget instead of each
+backing off on its own. Waiters are served by priority class: INTERACTIVE callers always
+get the next token before BACKGROUND (scheduler) callers.
+
+OPENSEA_RATE_LIMIT is the quota for the whole host. When several processes call OpenSea
+(uvicorn workers, scheduler_worker.py processes), each one runs leases.RateShare, which sets
+its bucket to its weighted share of the quota (API processes weigh API_RATE_WEIGHT, scheduler
+workers WORKER_RATE_WEIGHT), so together they stay under it and API traffic keeps precedence.
+"""
+import os
+import time
+import threading
+import datetime
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# relative share of the quota for a process serving the API vs a standalone scheduler worker
+API_RATE_WEIGHT = float(os.getenv("OPENSEA_RATE_API_WEIGHT", "3"))
+WORKER_RATE_WEIGHT = 1.0
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second up to `capacity`.
+    `penalize()` pauses all callers, e.g. for the duration of a Retry-After header.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        # configured values; rate/capacity are this process's share of them (see set_share)
+        self.quota_rate = self.rate
+        self.quota_capacity = self.capacity
+        self.share = 1.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._cond = threading.Condition()
+        self._waiting = {p: 0 for p in PRIORITY_NAMES}
+        # timestamps of recent grants, used to report the observed rate
+        self._grants: deque = deque()
+        self._granted = {p: 0 for p in PRIORITY_NAMES}
+        self._penalties = 0
+        self._penalty_seconds = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _higher_priority_waiting(self, priority: int) -> bool:
+        return any(count for p, count in self._waiting.items() if p < priority)
+
+    def acquire(self, priority: int = INTERACTIVE, timeout: Optional[float] = None) -> bool:
+        """
+        Block until a token is available. Returns False if `timeout` seconds pass first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+
+                    if now < self._blocked_until:
+                        wait = self._blocked_until - now
+                    elif self._higher_priority_waiting(priority):
+                        # re-check when the higher class takes its token (or shortly after)
+                        wait = max(1.0 / self.rate, 0.05)
+                    elif self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        self._grants.append(now)
+                        self._granted[priority] += 1
+                        self._cond.notify_all()
+                        return True
+                    else:
+                        wait = (1.0 - self._tokens) / self.rate
+
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            return False
+                        wait = min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._waiting[priority] -= 1
+
+    def set_share(self, share: float) -> None:
+        """Run at `share` (0-1] of the configured rate and burst, e.g. one process's slice of a shared quota."""
+        share = min(1.0, max(share, 1e-3))
+        with self._cond:
+            self._refill(time.monotonic())
+            self.share = share
+            self.rate = self.quota_rate * share
+            self.capacity = max(1.0, self.quota_capacity * share)
+            self._tokens = min(self._tokens, self.capacity)
+            self._cond.notify_all()
+
+    def penalize(self, seconds: float) -> None:
+        """Stop handing out tokens for `seconds` (the upstream told us to slow down)."""
+        if seconds <= 0:
+            return
+        with self._cond:
+            until = time.monotonic() + seconds
+            if until > self._blocked_until:
+                self._blocked_until = until
+            self._tokens = 0.0
+            self._penalties += 1
+            self._penalty_seconds += seconds
+            self._cond.notify_all()
+
+    def current_rate(self, window: float = 10.0) -> float:
+        """Tokens granted per second over the last `window` seconds."""
+        with self._cond:
+            cutoff = time.monotonic() - window
+            while self._grants and self._grants[0] < cutoff:
+                self._grants.popleft()
+            return len(self._grants) / window
+
+    def stats(self) -> Dict[str, Any]:
+        current = self.current_rate()
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                "rate": self.rate,
+                "capacity": self.capacity,
+                "quota_rate": self.quota_rate,
+                "share": self.share,
+                "current_rate": current,
+                "tokens": self._tokens,
+                "blocked_for": max(0.0, self._blocked_until - now),
+                "waiting": {PRIORITY_NAMES[p]: n for p, n in self._waiting.items()},
+                "granted": {PRIORITY_NAMES[p]: n for p, n in self._granted.items()},
+                "penalties": self._penalties,
+                "penalty_seconds": self._penalty_seconds,
+            }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delay in seconds or an HTTP date) into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+# shared by every outbound call in opensea_tools.py
+upstream_limiter = TokenBucket(
+    rate=float(os.getenv("OPENSEA_RATE_LIMIT", "4")),
+    capacity=float(os.getenv("OPENSEA_RATE_BURST", "8")),
+)
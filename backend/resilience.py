@@ -0,0 +1,406 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (c) 2025 Danila Novik & Heorhi Shtsivel
+
+"""
+Tail-latency controls for upstream OpenSea calls: deadlines, hedged requests, circuit breakers.
+
+- Deadlines: an API request may carry a time budget (`X-Request-Timeout` header, or API_REQUEST_TIMEOUT
+  by default). The middleware in api.py stores it in a context variable; upstream calls made on behalf
+  of that request cap their timeout, limiter wait and retry backoff by what is left, and fail with
+  DeadlineExceeded once it is spent. Work handed to thread pools keeps the deadline when submitted
+  through submit_in_context() (plain threads start without it, so background jobs have none).
+- Hedging: per endpoint type the recent response times are tracked; when a call has not answered
+  within the UPSTREAM_HEDGE_PERCENTILE latency, one duplicate request is sent and whichever answers
+  first wins. Hedges need a free rate limiter token (they never wait for one) and are capped at
+  UPSTREAM_HEDGE_MAX_RATIO of calls, so they cannot double the load.
+- Circuit breakers: per endpoint type, when at least BREAKER_MIN_CALLS calls in the last
+  BREAKER_WINDOW seconds failed at BREAKER_ERROR_RATE or more (errors, timeouts, 5xx), calls fail
+  at once with CircuitOpenError for BREAKER_COOLDOWN seconds; then a single probe decides whether
+  to close again. 4xx answers (429 included) count as healthy: the upstream is up.
+"""
+import bisect
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import requests
+
+# default upstream timeout (seconds), also the cap when a deadline leaves more
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "15"))
+# time budget for API requests without an X-Request-Timeout header (0 = none)
+API_REQUEST_TIMEOUT = float(os.getenv("API_REQUEST_TIMEOUT", "0"))
+DEADLINE_HEADER = "x-request-timeout"
+
+UPSTREAM_HEDGE = os.getenv("UPSTREAM_HEDGE", "1") != "0"
+UPSTREAM_HEDGE_PERCENTILE = float(os.getenv("UPSTREAM_HEDGE_PERCENTILE", "95"))
+UPSTREAM_HEDGE_MAX_RATIO = float(os.getenv("UPSTREAM_HEDGE_MAX_RATIO", "0.1"))
+# never hedge sooner than this, and not before this many latencies were seen for the endpoint
+UPSTREAM_HEDGE_MIN_DELAY = 0.05
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+# threads that carry hedge duplicates; a primary gets its own thread, so it never queues behind them
+HEDGE_POOL_SIZE = 64
+
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", "30"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "20"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+
+
+class DeadlineExceeded(requests.Timeout):
+    """The caller's time budget ran out before the upstream call could complete."""
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """The endpoint's circuit breaker is open; the call was not sent."""
+
+
+# ---- deadlines ----
+
+# time.monotonic() value by which the current API request must be answered
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("upstream_deadline", default=None)
+
+_counters_lock = threading.Lock()
+deadline_counters = {"requests_with_deadline": 0, "exceeded": 0}
+
+
+def _count_deadline(name: str) -> None:
+    with _counters_lock:
+        deadline_counters[name] += 1
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """Run the block with a deadline `seconds` from now (None or <= 0: keep the current one).
+    A nested scope can only shorten the deadline, never extend it."""
+    if seconds is None or seconds <= 0:
+        yield
+        return
+    new = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(new if current is None else min(current, new))
+    _count_deadline("requests_with_deadline")
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def parse_timeout_header(value: Optional[str]) -> Optional[float]:
+    """Seconds from an X-Request-Timeout header ("2.5"), or None if missing/invalid."""
+    try:
+        seconds = float(value) if value else None
+    except ValueError:
+        return None
+    return seconds if seconds and seconds > 0 else None
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline (None without one)."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline(what: str = "upstream call") -> None:
+    left = remaining()
+    if left is not None and left <= 0:
+        _count_deadline("exceeded")
+        raise DeadlineExceeded(f"deadline exceeded before {what}")
+
+
+def request_timeout(default: float = UPSTREAM_TIMEOUT) -> float:
+    """Timeout for the next upstream request: the default, capped by the current deadline."""
+    check_deadline()
+    left = remaining()
+    return default if left is None else min(default, left)
+
+
+def sleep_within_deadline(seconds: float) -> None:
+    """time.sleep() that raises DeadlineExceeded instead of sleeping past the deadline."""
+    left = remaining()
+    if left is not None and left < seconds:
+        _count_deadline("exceeded")
+        raise DeadlineExceeded(f"deadline leaves {max(left, 0):.2f}s, backoff needs {seconds:.2f}s")
+    time.sleep(seconds)
+
+
+def submit_in_context(executor: Executor, fn: Callable[..., Any], *args, **kwargs) -> Future:
+    """executor.submit() that runs `fn` with the caller's context variables (its deadline among them)."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+# ---- hedging ----
+
+class LatencyTracker:
+    """Recent upstream response times of one endpoint type, and the hedge delay derived from them."""
+
+    def __init__(self, window: int = LATENCY_WINDOW, percentile: float = UPSTREAM_HEDGE_PERCENTILE):
+        self.percentile = percentile
+        self._lock = threading.Lock()
+        self._samples: deque = deque(maxlen=window)
+        self._sorted: list = []
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            if len(self._samples) == self._samples.maxlen:
+                old = self._samples[0]
+                del self._sorted[bisect.bisect_left(self._sorted, old)]
+            self._samples.append(seconds)
+            bisect.insort(self._sorted, seconds)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there are too few samples."""
+        with self._lock:
+            n = len(self._sorted)
+            if n < HEDGE_MIN_SAMPLES:
+                return None
+            rank = min(n - 1, max(0, int(round(self.percentile / 100.0 * n)) - 1))
+            return max(UPSTREAM_HEDGE_MIN_DELAY, self._sorted[rank])
+
+    def try_hedge(self, max_ratio: float = UPSTREAM_HEDGE_MAX_RATIO) -> bool:
+        """Reserve a hedge if fewer than `max_ratio` of calls were hedged so far."""
+        with self._lock:
+            if self.hedges + 1 > max_ratio * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+    def count_call(self) -> None:
+        with self._lock:
+            self.calls += 1
+
+    def count_win(self) -> None:
+        with self._lock:
+            self.hedge_wins += 1
+
+    def stats(self) -> Dict[str, Any]:
+        delay = self.hedge_delay()
+        with self._lock:
+            return {"calls": self.calls, "hedges": self.hedges, "hedge_wins": self.hedge_wins,
+                    "hedge_delay_ms": None if delay is None else round(delay * 1000, 1),
+                    "samples": len(self._samples)}
+
+
+_hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_POOL_SIZE, thread_name_prefix="upstream-hedge")
+
+
+def _start_in_context(fn: Callable[[], Any]) -> Future:
+    """Run `fn` at once on a new thread, with the caller's context variables; its result lands in the future."""
+    future: Future = Future()
+    future.set_running_or_notify_cancel()
+    context = contextvars.copy_context()
+
+    def run() -> None:
+        try:
+            future.set_result(context.run(fn))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="upstream-primary", daemon=True).start()
+    return future
+
+
+def hedged_call(send: Callable[[float], requests.Response], tracker: LatencyTracker,
+                reserve_token: Callable[[], bool], enabled: bool = UPSTREAM_HEDGE) -> requests.Response:
+    """
+    Call `send(timeout)`, and once more if the first call is slower than the tracker's hedge delay.
+    Returns the first response below 500 (else the last one); raises the last error if both failed.
+    `reserve_token()` must grant an upstream token without waiting, or the hedge is skipped.
+    """
+    timeout = request_timeout()
+    # a timeout shorter than the default was set by the deadline: hitting it means the deadline is spent
+    capped = timeout < UPSTREAM_TIMEOUT
+    tracker.count_call()
+
+    def timed() -> requests.Response:
+        started = time.perf_counter()
+        resp = send(timeout)
+        tracker.observe(time.perf_counter() - started)
+        return resp
+
+    delay = tracker.hedge_delay() if enabled else None
+    if delay is None or delay >= timeout:
+        try:
+            return timed()
+        except requests.Timeout as e:
+            _raise_if_deadline(e, capped)
+            raise
+
+    # the primary starts right away, so the hedge delay counts from when it is actually sent
+    primary = _start_in_context(timed)
+    done, _ = wait([primary], timeout=delay)
+    pending = {primary}
+    hedge: Optional[Future] = None
+    if not done and tracker.try_hedge() and reserve_token():
+        hedge = submit_in_context(_hedge_pool, timed)
+        pending.add(hedge)
+
+    last_resp: Optional[requests.Response] = None
+    last_error: Optional[BaseException] = None
+    while pending:
+        # both requests carry `timeout`, so this returns within it
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            error = future.exception()
+            if error is not None:
+                last_error = error
+                continue
+            resp = future.result()
+            if resp.status_code < 500:
+                if future is hedge:
+                    tracker.count_win()
+                return resp
+            last_resp = resp
+    if last_resp is not None:
+        return last_resp
+    _raise_if_deadline(last_error, capped)
+    raise last_error
+
+
+def _raise_if_deadline(error: BaseException, capped: bool) -> None:
+    if capped and isinstance(error, requests.Timeout) and not isinstance(error, DeadlineExceeded):
+        _count_deadline("exceeded")
+        raise DeadlineExceeded(f"deadline exceeded during upstream call: {error}") from error
+
+
+# ---- circuit breaker ----
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+
+    def __init__(self, name: str, window: float = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 error_rate: float = BREAKER_ERROR_RATE, cooldown: float = BREAKER_COOLDOWN):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        # (monotonic time, ok) of recent calls
+        self._outcomes: deque = deque()
+        self._failures = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self.opened = 0
+        self.rejected = 0
+        self.served_cached = 0
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            _, ok = self._outcomes.popleft()
+            if not ok:
+                self._failures -= 1
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self._state = HALF_OPEN
+            return self._state
+
+    def is_open(self) -> bool:
+        return self.state == OPEN
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may go out now; every allowed call must be followed by record()."""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self._state = HALF_OPEN
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and not self._probing:
+                # one probe at a time decides whether the upstream is back
+                self._probing = True
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"circuit open for {self.name} upstream calls")
+
+    def record(self, ok: Optional[bool]) -> None:
+        """Outcome of an allowed call: True healthy, False failed, None neither (e.g. our own deadline hit)."""
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN and self._probing:
+                self._probing = False
+                if ok is True:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                    self._failures = 0
+                elif ok is False:
+                    self._state = OPEN
+                    self._opened_at = now
+                    self.opened += 1
+                return
+            if ok is None or self._state != CLOSED:
+                return
+            self._outcomes.append((now, ok))
+            if not ok:
+                self._failures += 1
+            self._trim(now)
+            calls = len(self._outcomes)
+            if calls >= self.min_calls and self._failures >= self.error_rate * calls:
+                self._state = OPEN
+                self._opened_at = now
+                self.opened += 1
+                print(f"[resilience] circuit opened for {self.name}: {self._failures}/{calls} failed")
+
+    def count_served_cached(self) -> None:
+        with self._lock:
+            self.served_cached += 1
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            self._trim(time.monotonic())
+            return {"state": state, "recent_calls": len(self._outcomes), "recent_failures": self._failures,
+                    "opened": self.opened, "rejected": self.rejected, "served_cached": self.served_cached}
+
+
+class Upstream:
+    """Latency tracker and circuit breaker per endpoint type ("collections", "stats", ...)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.trackers: Dict[str, LatencyTracker] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def tracker(self, endpoint: str) -> LatencyTracker:
+        with self._lock:
+            if endpoint not in self.trackers:
+                self.trackers[endpoint] = LatencyTracker()
+            return self.trackers[endpoint]
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            if endpoint not in self.breakers:
+                self.breakers[endpoint] = CircuitBreaker(endpoint)
+            return self.breakers[endpoint]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = sorted(set(self.trackers) | set(self.breakers))
+        with _counters_lock:
+            deadlines = dict(deadline_counters)
+        return {
+            "timeout": UPSTREAM_TIMEOUT,
+            "hedging": {"enabled": UPSTREAM_HEDGE, "percentile": UPSTREAM_HEDGE_PERCENTILE,
+                        "max_ratio": UPSTREAM_HEDGE_MAX_RATIO},
+            "deadlines": {"default_seconds": API_REQUEST_TIMEOUT or None, **deadlines},
+            "endpoints": {e: {"latency": self.tracker(e).stats(), "breaker": self.breaker(e).stats()}
+                          for e in endpoints},
+        }
+
+
+# shared by every upstream call in the process
+upstream = Upstream()
@@ -1,81 +1,311 @@
 # scheduler.py
 import asyncio
-import csv
+import glob
+import heapq
+import math
 import os
+import random
+import time
 import datetime
 from concurrent.futures import ThreadPoolExecutor
-from typing import List, Optional
+from functools import partial
+from typing import Any, Dict, List, Optional
 
 
-from opensea_tools import get_api_key, make_session, fetch_collections, fetch_collection_stats
+import requests
 
+from opensea_tools import (get_shared_session, fetch_collections, iter_collection_stats,
+                           get_collection_slug, extract_floor_price)
+from rate_limiter import BACKGROUND
+from floor_store import FloorStore, get_floor_store
+from leases import LeaseStore, make_worker_id
+from journal import REPLAY
+import metrics
+
+# legacy history file, imported into the floor store once on startup
 CSV_PATH = "floor_prices.csv"
 
-def ensure_csv_exists():
-    if not os.path.exists(CSV_PATH):
-        with open(CSV_PATH, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(["timestamp_utc", "collection_slug", "floor_price"])  # header
+# chains whose top collections are tracked; comma-separated chains are crawled concurrently
+SCHEDULER_CHAINS = os.getenv("SCHEDULER_CHAINS", "base")
+
+# relative floor move between samples (stddev of log returns) that counts as "normal" volatility
+VOLATILITY_REF = 0.02
+# 24h volume (ETH) that counts as "normally" liquid
+VOLUME_REF = 1.0
+# samples used to estimate volatility
+VOLATILITY_SAMPLES = 12
+
+def _stale_claim(path: str) -> bool:
+    """True for a `<CSV_PATH>.importing[.<pid>]` claim whose importing process is gone."""
+    suffix = path[len(CSV_PATH + ".importing"):]
+    if not suffix:
+        # claim name used before claims carried a pid
+        return True
+    try:
+        pid = int(suffix.lstrip("."))
+    except ValueError:
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass
+    return False
+
+def migrate_legacy_csv():
+    """Import rows from the old append-only CSV into the floor store, then set the CSV aside (kept in place on failure)."""
+    # the CSV itself, or a claim left behind by a worker that crashed before finishing its import
+    sources = [CSV_PATH] + [p for p in sorted(glob.glob(CSV_PATH + ".importing*")) if _stale_claim(p)]
+    claimed = f"{CSV_PATH}.importing.{os.getpid()}"
+    for source in sources:
+        try:
+            # claim the file first so concurrent workers never import it twice
+            os.replace(source, claimed)
+        except OSError:
+            continue
+        try:
+            imported = get_floor_store().import_csv(claimed)
+        except Exception as e:
+            # give the file back so the next start retries it; rows already written are upserted again harmlessly
+            os.replace(claimed, source)
+            print(f"[scheduler] failed to import {source}, will retry on next start: {e}")
+            return
+        # a recovered claim keeps its suffix so it does not overwrite the CSV imported before it
+        os.replace(claimed, CSV_PATH + ".imported" + source[len(CSV_PATH + ".importing"):])
+        print(f"[scheduler] imported {imported} rows from {source}")
 
 def append_rows(rows: List[List]):
-    """Append rows to CSV (rows = [[ts, slug, floor], ...])"""
-    ensure_csv_exists()
-    # Небольшая защита: открываем и дописываем в атомарном режиме
-    with open(CSV_PATH, "a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerows(rows)
-
-def fetch_floor_for_slugs(session, slugs: List[str]):
-    rows = []
-    now = datetime.datetime.utcnow().replace(microsecond=0).isoformat()  # UTC ISO
-    for slug in slugs:
+    """Write one batch of rows (rows = [[ts, slug, floor], ...]) to the floor store in a single transaction"""
+    return get_floor_store().write_batch(rows)
+
+async def renew_leases(lease_store: LeaseStore, worker_id: str, executor: ThreadPoolExecutor):
+    """Keep the held leases alive every lease_seconds / 3, also while a crawl or batch is in flight."""
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(lease_store.lease_seconds / 3)
         try:
-            stats = fetch_collection_stats(session, slug)
-            floor = None
-            if stats is None:
-                floor = None
-            else:
-                floor = stats.get("floor_price")
-                if floor is None:
-                    floor = stats.get("stats", {}).get("floor_price") if isinstance(stats, dict) else None
-                if floor is not None:
-                    try:
-                        floor = float(floor)
-                    except Exception:
-                        floor = None
+            await loop.run_in_executor(executor, lease_store.renew, worker_id)
         except Exception as e:
-            # не ломаем цикл на одной ошибке
-            print(f"[scheduler] error fetching {slug}: {e}")
-            floor = None
+            print(f"[scheduler] lease renewal failed: {e}")
 
-        rows.append([now, slug, floor])
+def fetch_floor_for_slugs(session, slugs: List[str], stats_out: Optional[Dict[str, Any]] = None,
+                          max_in_flight: int = 4):
+    """Fetch fresh (uncached) stats concurrently; returns [[ts, slug, floor], ...] and fills `stats_out` if given."""
+    rows = []
+    now = datetime.datetime.utcnow().replace(microsecond=0).isoformat()  # UTC ISO
+    for slug, stats in iter_collection_stats(session, slugs, max_in_flight=max_in_flight,
+                                             priority=BACKGROUND, use_cache=False):
+        if stats_out is not None:
+            stats_out[slug] = stats
+        rows.append([now, slug, extract_floor_price(stats)])
     return rows
 
-async def scheduler_loop(interval_seconds: int = 3600, slugs: Optional[List[str]] = None, limit_slugs: Optional[int] = 200):
-    api_key = get_api_key()
-    session = make_session(api_key)
+
+def floor_volatility(store: FloorStore, slug: str, samples: int = VOLATILITY_SAMPLES) -> float:
+    """Standard deviation of log returns over the last `samples` floors (0 with too little history)."""
+    floors = [floor for _, floor in store.recent(slug, samples) if floor and floor > 0]
+    returns = [math.log(b / a) for a, b in zip(floors, floors[1:])]
+    if len(returns) < 2:
+        return 0.0
+    mean = sum(returns) / len(returns)
+    return math.sqrt(sum((r - mean) ** 2 for r in returns) / (len(returns) - 1))
+
+
+def one_day_volume(stats: Optional[Dict[str, Any]]) -> float:
+    for it in (stats or {}).get("intervals") or []:
+        if isinstance(it, dict) and it.get("interval") == "one_day":
+            try:
+                return float(it.get("volume") or 0.0)
+            except (TypeError, ValueError):
+                return 0.0
+    return 0.0
+
+
+class RefreshPlanner:
+    """
+    Priority queue of per-slug refresh times.
+
+    Each slug's next refresh comes from its "heat": recent floor volatility plus 24h volume,
+    both relative to a reference level. Heat 1 refreshes every `base_interval`; hotter slugs
+    refresh more often, quiet or illiquid ones less, always within [min_interval, max_interval].
+    New slugs are staggered evenly over `base_interval` so refreshes are spread out, not burst.
+    """
+
+    def __init__(self, base_interval: float = 3600, min_interval: float = 300, max_interval: float = 6 * 3600,
+                 store: Optional[FloorStore] = None):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.store = store
+        self._heap: List = []
+        # slug -> currently scheduled due time; heap entries that disagree are stale and skipped
+        self._due: Dict[str, float] = {}
+        self._last_refreshed: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def _push(self, slug: str, due: float) -> None:
+        self._due[slug] = due
+        heapq.heappush(self._heap, (due, slug))
+
+    def set_slugs(self, slugs: List[str], now: Optional[float] = None) -> None:
+        """Track exactly `slugs`: new ones are staggered across base_interval, missing ones dropped."""
+        now = time.time() if now is None else now
+        wanted = list(dict.fromkeys(slugs))
+        for slug in list(self._due):
+            if slug not in wanted:
+                del self._due[slug]
+        new = [slug for slug in wanted if slug not in self._due]
+        step = self.base_interval / max(len(new), 1)
+        for i, slug in enumerate(new):
+            self._push(slug, now + i * step)
+
+    def interval_for(self, slug: str, stats: Optional[Dict[str, Any]]) -> float:
+        volatility = floor_volatility(self.store or get_floor_store(), slug)
+        heat = volatility / VOLATILITY_REF + math.log1p(one_day_volume(stats)) / math.log1p(VOLUME_REF)
+        interval = self.base_interval / heat if heat > 0 else self.max_interval
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def next_due(self) -> Optional[float]:
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float, limit: int) -> List[str]:
+        due = []
+        while len(due) < limit:
+            head = self.next_due()
+            if head is None or head > now:
+                break
+            _, slug = heapq.heappop(self._heap)
+            del self._due[slug]
+            due.append(slug)
+        return due
+
+    def reschedule(self, slug: str, stats: Optional[Dict[str, Any]], now: Optional[float] = None) -> float:
+        """Record a refresh of `slug` and queue the next one; returns the chosen interval."""
+        now = time.time() if now is None else now
+        self._last_refreshed[slug] = now
+        # failed fetches retry at the fastest allowed pace instead of waiting out a long interval
+        interval = self.interval_for(slug, stats) if stats is not None else self.min_interval
+        # +-10% jitter keeps slugs with equal intervals from drifting into a burst
+        self._push(slug, now + interval * random.uniform(0.9, 1.1))
+        return interval
+
+    def staleness(self, slug: str, now: Optional[float] = None) -> Optional[float]:
+        """Seconds since `slug` was last refreshed (None if never)."""
+        last = self._last_refreshed.get(slug)
+        return None if last is None else (time.time() if now is None else now) - last
+
+
+async def scheduler_loop(interval_seconds: int = 3600, slugs: Optional[List[str]] = None, limit_slugs: Optional[int] = 200,
+                         session: Optional[requests.Session] = None, min_interval: float = 300,
+                         max_interval: float = 6 * 3600, batch_size: int = 10,
+                         lease_store: Optional[LeaseStore] = None, worker_id: Optional[str] = None,
+                         chain: str = SCHEDULER_CHAINS):
+    """
+    Refresh floors slug by slug as they come due (see RefreshPlanner). `interval_seconds` is the base
+    refresh interval and also how often the tracked slug set is re-crawled when `slugs` is None.
+    With a `lease_store`, this loop is one of possibly many workers: the slug set is published to
+    the store by whichever worker holds the "crawl" lock, and each worker only refreshes the slugs
+    it holds leases for (see leases.py).
+    `chain` picks the crawled chains; several ("base,ethereum") are crawled concurrently and the top
+    `limit_slugs` by market cap across all of them are tracked.
+    Does nothing in replay mode (OPENSEA_REPLAY=1 or an offline session): replayed responses are old and
+    would be stored as current floor samples.
+    """
+    if session is None:
+        session = get_shared_session()
+    if REPLAY or getattr(session, "offline", False):
+        print("[scheduler] replay mode: not refreshing floors")
+        return
+    if lease_store is not None and worker_id is None:
+        worker_id = make_worker_id()
     executor = ThreadPoolExecutor(max_workers=4)
 
-    # Ensure CSV has header
-    ensure_csv_exists()
+    migrate_legacy_csv()
+
+    planner = RefreshPlanner(base_interval=interval_seconds, min_interval=min_interval, max_interval=max_interval)
+    next_slug_refresh = 0.0
+    next_lease_renewal = 0.0
 
     loop = asyncio.get_event_loop()
-    while True:
-        try:
-            if slugs is None:
-                cols = await loop.run_in_executor(executor, fetch_collections, session, "base", "market_cap", 100, limit_slugs)
-                slugs_list = [c.get("slug") for c in cols if c.get("slug")]
-            else:
-                slugs_list = slugs
+    # acquire() below rebalances between batches; this only extends the leases, so long batches keep them
+    heartbeat = loop.create_task(renew_leases(lease_store, worker_id, executor)) if lease_store is not None else None
+    try:
+        while True:
+            try:
+                now = time.time()
+                if now >= next_slug_refresh:
+                    crawl = lease_store is None or await loop.run_in_executor(
+                        executor, lease_store.try_lock, "crawl", worker_id, interval_seconds)
+                    if crawl:
+                        if slugs is None:
+                            fetch = partial(fetch_collections, session, chain, "market_cap", 100, limit_slugs, priority=BACKGROUND)
+                            cols = await loop.run_in_executor(executor, fetch)
+                            slugs_list = [get_collection_slug(c) for c in cols if get_collection_slug(c)]
+                        else:
+                            slugs_list = slugs
+                        if slugs_list:
+                            if lease_store is None:
+                                planner.set_slugs(slugs_list, now)
+                                metrics.scheduler_tracked_slugs.set(len(planner))
+                                print(f"[scheduler] tracking {len(planner)} slugs")
+                            else:
+                                await loop.run_in_executor(executor, lease_store.set_slugs, slugs_list)
+                                next_lease_renewal = 0.0
+                    next_slug_refresh = now + interval_seconds
 
-            rows = await loop.run_in_executor(executor, fetch_floor_for_slugs, session, slugs_list)
+                if lease_store is not None and now >= next_lease_renewal:
+                    owned = await loop.run_in_executor(executor, lease_store.acquire, worker_id)
+                    before = len(planner)
+                    planner.set_slugs(owned, now)
+                    if len(planner) != before:
+                        print(f"[scheduler] worker {worker_id} holds {len(planner)} slugs")
+                    metrics.scheduler_tracked_slugs.set(len(planner))
+                    next_lease_renewal = now + lease_store.lease_seconds / 3
 
-            await loop.run_in_executor(executor, append_rows, rows)
+                due = planner.pop_due(time.time(), batch_size)
+                if due:
+                    started = time.time()
+                    stats_by_slug: Dict[str, Any] = {}
+                    fetch = partial(fetch_floor_for_slugs, session, due, stats_by_slug)
+                    rows = await loop.run_in_executor(executor, fetch)
+                    written = await loop.run_in_executor(executor, append_rows, rows)
 
-            print(f"[scheduler] wrote {len(rows)} rows at {datetime.datetime.utcnow().isoformat()}")
+                    done = time.time()
+                    metrics.scheduler_cycle_seconds.observe(done - started)
+                    metrics.scheduler_slugs_refreshed.inc(len(rows))
+                    metrics.scheduler_slugs_per_second.set(len(rows) / max(done - started, 1e-9))
+                    ages = []
+                    for _, slug, floor in rows:
+                        age = planner.staleness(slug, done)
+                        interval = await loop.run_in_executor(executor, planner.reschedule, slug, stats_by_slug.get(slug), done)
+                        if age is not None:
+                            ages.append(age)
+                        print(f"[scheduler] {slug}: floor={floor} data_age={'n/a' if age is None else f'{age:.0f}s'} next_in={interval:.0f}s")
+                    avg_age = f"{sum(ages) / len(ages):.0f}s" if ages else "n/a"
+                    print(f"[scheduler] wrote {written}/{len(rows)} rows in {done - started:.1f}s "
+                          f"(avg data age {avg_age}) at {datetime.datetime.utcnow().isoformat()}")
 
-        except Exception as e:
-            print(f"[scheduler] top-level error: {e}")
+            except Exception as e:
+                print(f"[scheduler] top-level error: {e}")
 
-        # Ждём интервал
-        await asyncio.sleep(interval_seconds)
+            # sleep until the next slug is due (or the slug set / leases need attention)
+            wake = next_slug_refresh
+            next_due = planner.next_due()
+            if next_due is not None:
+                wake = min(wake, next_due)
+            if lease_store is not None:
+                wake = min(wake, next_lease_renewal)
+            await asyncio.sleep(min(max(wake - time.time(), 0.5), 60))
+    finally:
+        if heartbeat is not None:
+            heartbeat.cancel()
+        if lease_store is not None:
+            # hand our slugs back right away instead of making the others wait for expiry
+            lease_store.release(worker_id)
@@ -0,0 +1,103 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (c) 2025 Danila Novik & Heorhi Shtsivel
+
+"""
+Run the floor price scheduler as standalone worker processes.
+
+Workers split the slug set through leases in a shared SQLite file (see leases.py), so starting
+more of them, here or in another process group on the same host, adds refresh throughput
+without duplicate fetches. If a worker dies, its leases expire and the others take its slugs.
+The upstream rate quota is split the same way (leases.RateShare): every worker and API process
+gets a weighted slice of OPENSEA_RATE_LIMIT, so adding workers never raises the total rate.
+
+Run:
+    python scheduler_worker.py --workers 4
+and start the API with EMBEDDED_SCHEDULER=0 so it does not run a scheduler of its own.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+from typing import Optional
+
+from leases import LeaseStore, RateShare, LEASE_DB_PATH, make_worker_id
+from opensea_tools import close_shared_session
+from rate_limiter import upstream_limiter, WORKER_RATE_WEIGHT
+
+
+def run_worker(interval_seconds: int, limit_slugs: int, lease_db: str, lease_seconds: float,
+               min_interval: float, max_interval: float, chain: str) -> None:
+    # the parent has already imported opensea_tools and its limiter, so a forked worker starts with a copy
+    # of the parent's bucket at the full quota; RateShare scales it down to this worker's slice
+    from scheduler import scheduler_loop
+
+    rate_share = RateShare(upstream_limiter, WORKER_RATE_WEIGHT, path=lease_db).start()
+    worker_id = make_worker_id()
+    lease_store = LeaseStore(lease_db, lease_seconds=lease_seconds)
+    print(f"[worker] {worker_id} started")
+
+    async def main():
+        task = asyncio.create_task(scheduler_loop(
+            interval_seconds=interval_seconds, slugs=None, limit_slugs=limit_slugs,
+            min_interval=min_interval, max_interval=max_interval,
+            lease_store=lease_store, worker_id=worker_id, chain=chain))
+        loop = asyncio.get_running_loop()
+        # SIGTERM cancels the loop so its leases are released right away
+        loop.add_signal_handler(signal.SIGTERM, task.cancel)
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close_shared_session()
+        rate_share.stop()
+        lease_store.close()
+        print(f"[worker] {worker_id} stopped")
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run floor price scheduler workers")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--interval", type=int, default=3600, help="base refresh interval (seconds)")
+    parser.add_argument("--limit-slugs", type=int, default=100)
+    parser.add_argument("--min-interval", type=float, default=300)
+    parser.add_argument("--max-interval", type=float, default=6 * 3600)
+    parser.add_argument("--lease-db", default=LEASE_DB_PATH)
+    parser.add_argument("--lease-seconds", type=float, default=120)
+    parser.add_argument("--chains", default=os.getenv("SCHEDULER_CHAINS", "base"),
+                        help="comma-separated chains to track (crawled concurrently)")
+    args = parser.parse_args(argv)
+
+    worker_args = (args.interval, args.limit_slugs, args.lease_db, args.lease_seconds,
+                   args.min_interval, args.max_interval, args.chains)
+    procs = []
+    for _ in range(args.workers):
+        proc = multiprocessing.Process(target=run_worker, args=worker_args, daemon=False)
+        proc.start()
+        procs.append(proc)
+
+    try:
+        # restart crashed workers; their old leases expire on their own
+        while True:
+            for i, proc in enumerate(procs):
+                if not proc.is_alive():
+                    print(f"[worker] process {proc.pid} exited with {proc.exitcode}; restarting")
+                    procs[i] = multiprocessing.Process(target=run_worker, args=worker_args, daemon=False)
+                    procs[i].start()
+            time.sleep(5)
+    except KeyboardInterrupt:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (c) 2025 Danila Novik & Heorhi Shtsivel
+
+"""
+Pre-serialized bubble chart snapshot.
+
+Rebuilt whenever the pipeline or a scheduler cycle finishes, then served from memory as
+ready-made JSON bytes with an ETag, so the chart endpoint does no parsing or I/O per request.
+Each item carries the real 24h floor change computed from the floor store.
+"""
+import csv
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from floor_store import FloorStore, get_floor_store
+from opensea_tools import get_collection_slug, extract_floor_price
+from image_cache import image_key
+
+FILTERED_CSV_PATH = "filtered_collections.csv"
+DAY_SECONDS = 24 * 3600
+
+
+class Snapshot:
+    __slots__ = ("body", "etag", "built_at", "count")
+
+    def __init__(self, body: bytes, built_at: float, count: int):
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.built_at = built_at
+        self.count = count
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """True if an If-None-Match header value names this snapshot's ETag."""
+        if not if_none_match:
+            return False
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return any(t == "*" or (t[2:] if t.startswith("W/") else t) == self.etag for t in tags)
+
+
+def floor_change_24h(store: FloorStore, slug: str, now: Optional[float] = None) -> Tuple[Optional[float], Optional[float]]:
+    """(latest floor, % change vs. the last sample at least 24h older) from the floor store."""
+    latest = store.latest(slug)
+    if latest is None:
+        return None, None
+    ts, floor = latest
+    day_ago = store.latest(slug, at_or_before=min(ts, int(now or time.time())) - DAY_SECONDS)
+    if day_ago is None or not day_ago[1]:
+        return floor, None
+    return floor, (floor - day_ago[1]) / day_ago[1] * 100.0
+
+
+class SnapshotHolder:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # slim per-collection source fields kept between rebuilds (slug, name, image, link, floor)
+        self._entries: List[Dict[str, Any]] = []
+        self._current = Snapshot(b"[]", time.time(), 0)
+
+    def get(self) -> Snapshot:
+        return self._current
+
+    def set_collections(self, entries: Iterable[Tuple[Dict[str, Any], Dict[str, Any]]]) -> None:
+        """Replace the chart's collection set with (general_info, stats) pairs."""
+        slim = []
+        for info, stats in entries:
+            slug = get_collection_slug(info)
+            if not slug:
+                continue
+            slim.append({
+                "slug": slug,
+                "name": info.get("name") or slug,
+                "image": info.get("image_url"),
+                "link": info.get("opensea_url"),
+                "floor": extract_floor_price(stats),
+            })
+        with self._lock:
+            self._entries = slim
+
+    def image_urls(self) -> List[str]:
+        """Image URLs of the chart's collections (for the thumbnail prefetch)."""
+        with self._lock:
+            return [entry["image"] for entry in self._entries if entry["image"]]
+
+    def load_csv(self, path: str = FILTERED_CSV_PATH) -> None:
+        """Take the chart's collection set from a filtered_collections.csv."""
+        csv.field_size_limit(2 ** 31 - 1)
+        entries = []
+        with open(path, newline="", encoding="utf-8") as fh:
+            for rec in csv.DictReader(fh):
+                try:
+                    entries.append((json.loads(rec["general_info"]), json.loads(rec["stats"])))
+                except (KeyError, TypeError, ValueError):
+                    continue
+        self.set_collections(entries)
+
+    def rebuild(self, store: Optional[FloorStore] = None) -> Snapshot:
+        """Recompute floors and 24h changes from the floor store and swap in a new snapshot."""
+        store = store or get_floor_store()
+        with self._lock:
+            entries = list(self._entries)
+        items = []
+        for entry in entries:
+            floor, change = floor_change_24h(store, entry["slug"])
+            if floor is None:
+                floor = entry["floor"]
+            item = {
+                "slug": entry["slug"],
+                "name": entry["name"],
+                "image": entry["image"],
+                "floorEth": floor,
+                "change24hPct": round(change, 2) if change is not None else None,
+            }
+            if entry["image"]:
+                # thumbnail served by /images/{key} (see image_cache.py)
+                item["imageKey"] = image_key(entry["image"])
+            if entry["link"]:
+                item["link"] = entry["link"]
+            items.append(item)
+        snap = Snapshot(json.dumps(items, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+                        time.time(), len(items))
+        self._current = snap
+        return snap
+
+
+# the chart snapshot served by GET /snapshot
+snapshot = SnapshotHolder()
@@ -0,0 +1,159 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (c) 2025 Danila Novik & Heorhi Shtsivel
+
+"""
+In-process TTL + LRU cache with stale-while-revalidate, used for per-slug collection stats.
+
+Fresh entries (younger than `ttl`) are served directly. Stale entries (up to `ttl + max_stale`)
+are still served, while a single background thread refreshes them. Anything older, or missing,
+is fetched synchronously; concurrent misses for the same key share one fetch.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class TTLCache:
+
+    def __init__(self, ttl: float = 60.0, max_size: int = 5000, max_stale: float = 600.0):
+        self.ttl = float(ttl)
+        self.max_size = int(max_size)
+        self.max_stale = float(max_stale)
+        self._lock = threading.Lock()
+        # key -> (value, fetched_at), ordered from least to most recently used
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[str, threading.Event] = {}
+        self._refreshing: set = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+        # bumped on every insert so derived views (e.g. the stats table) know when to rebuild
+        self.version = 0
+
+    def _store(self, key: str, value: Any, fetched_at: float) -> None:
+        # caller holds the lock
+        self._entries[key] = (value, fetched_at)
+        self._entries.move_to_end(key)
+        self.version += 1
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, key: str, value: Any, fetched_at: Optional[float] = None) -> None:
+        """Insert a value; `fetched_at` (time.time()) lets callers load older data as already aged."""
+        if value is None:
+            return
+        with self._lock:
+            self._store(key, value, time.time() if fetched_at is None else fetched_at)
+
+    def peek(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Return (value, age_seconds) without counting a hit or triggering a refresh."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return entry[0], time.time() - entry[1]
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """Snapshot of every cached (key, value), stale ones included."""
+        with self._lock:
+            return [(k, v) for k, (v, _) in self._entries.items()]
+
+    def clear(self) -> None:
+        """Drop every entry (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self.version += 1
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Any],
+                     refresh: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        Return the cached value for `key`, calling `fetch()` on a miss.
+        `refresh` (defaults to `fetch`) is what the background thread calls for stale entries.
+        `None` results are never cached.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    value, fetched_at = entry
+                    age = time.time() - fetched_at
+                    if age <= self.ttl:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        return value
+                    if age <= self.ttl + self.max_stale:
+                        self._entries.move_to_end(key)
+                        self.stale_hits += 1
+                        if key not in self._refreshing:
+                            self._refreshing.add(key)
+                            threading.Thread(target=self._refresh, args=(key, refresh or fetch), daemon=True).start()
+                        return value
+
+                waiter = self._inflight.get(key)
+                if waiter is None:
+                    self.misses += 1
+                    event = threading.Event()
+                    self._inflight[key] = event
+                    break
+
+            # another thread is already fetching this key; wait and re-check the cache
+            waiter.wait()
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is None:
+                # the other fetch failed; fetch ourselves rather than loop on it
+                return fetch()
+
+        try:
+            value = fetch()
+            if value is not None:
+                with self._lock:
+                    self._store(key, value, time.time())
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def _refresh(self, key: str, fetch: Callable[[], Any]) -> None:
+        try:
+            value = fetch()
+            if value is not None:
+                with self._lock:
+                    self._store(key, value, time.time())
+                    self.refreshes += 1
+        except Exception as e:
+            print(f"[cache] background refresh failed for {key}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "max_stale": self.max_stale,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "refreshes": self.refreshes,
+                "refreshing": len(self._refreshing),
+            }
+
+
+# slug -> stats JSON, shared by the API handlers, /filter and the scheduler
+stats_cache = TTLCache(
+    ttl=float(os.getenv("OPENSEA_STATS_TTL", "60")),
+    max_size=int(os.getenv("OPENSEA_STATS_CACHE_SIZE", "5000")),
+    max_stale=float(os.getenv("OPENSEA_STATS_MAX_STALE", "600")),
+)
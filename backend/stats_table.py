@@ -0,0 +1,157 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (c) 2025 Danila Novik & Heorhi Shtsivel
+
+"""
+Columnar, NumPy-backed view of collection stats for vectorized filtering and ranking.
+
+One row per slug; one float64 column per `<interval>_<field>` (e.g. `seven_day_volume`) and
+per `total_<field>` (e.g. `total_market_cap`). Missing values are NaN, and every comparison
+with NaN is False, so a collection without a field never passes a predicate on it.
+The table over the stats cache is rebuilt only when the cache changes, so re-filtering
+cached stats with new thresholds costs a few array operations and no upstream calls.
+"""
+import operator
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from opensea_tools import normalize_interval
+from stats_cache import stats_cache
+
+INTERVALS = ("one_day", "seven_day", "thirty_day")
+INTERVAL_FIELDS = ("volume", "volume_diff", "volume_change", "sales", "sales_diff", "average_price")
+TOTAL_FIELDS = ("volume", "sales", "num_owners", "market_cap", "floor_price", "average_price")
+COLUMNS = tuple(f"{i}_{f}" for i in INTERVALS for f in INTERVAL_FIELDS) + tuple(f"total_{f}" for f in TOTAL_FIELDS)
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+Predicate = Tuple[str, str, float]
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class StatsTable:
+
+    def __init__(self, slugs: np.ndarray, columns: Dict[str, np.ndarray]):
+        self.slugs = slugs
+        self.columns = columns
+
+    @classmethod
+    def from_stats(cls, items: Iterable[Tuple[str, Dict[str, Any]]]) -> "StatsTable":
+        """Build from (slug, stats_json) pairs as returned by fetch_collection_stats."""
+        slugs: List[str] = []
+        rows: List[List[float]] = []
+        index = {name: i for i, name in enumerate(COLUMNS)}
+        for slug, stats in items:
+            if not isinstance(stats, dict):
+                continue
+            row = [np.nan] * len(COLUMNS)
+            for field, value in (stats.get("total") or {}).items():
+                i = index.get(f"total_{field}")
+                if i is not None:
+                    row[i] = _to_float(value)
+            for it in stats.get("intervals") or []:
+                if not isinstance(it, dict):
+                    continue
+                name = it.get("interval")
+                for field in INTERVAL_FIELDS:
+                    i = index.get(f"{name}_{field}")
+                    if i is not None:
+                        row[i] = _to_float(it.get(field))
+            slugs.append(slug)
+            rows.append(row)
+        # column-major so each column is one contiguous array
+        matrix = np.array(rows, dtype=np.float64).reshape(len(rows), len(COLUMNS)).T.copy()
+        return cls(np.array(slugs, dtype=object), {name: matrix[i] for i, name in enumerate(COLUMNS)})
+
+    def __len__(self) -> int:
+        return len(self.slugs)
+
+    def column(self, name: str) -> np.ndarray:
+        try:
+            return self.columns[name]
+        except KeyError:
+            raise ValueError(f"Unknown column {name!r}; expected one of {', '.join(COLUMNS)}")
+
+    def mask(self, predicates: Sequence[Predicate]) -> np.ndarray:
+        """AND of `column <op> value` predicates, e.g. [("seven_day_volume", ">", 1.0)]."""
+        result = np.ones(len(self), dtype=bool)
+        for name, op, value in predicates:
+            fn = OPERATORS.get(op)
+            if fn is None:
+                raise ValueError(f"Unknown operator {op!r}; expected one of {', '.join(OPERATORS)}")
+            with np.errstate(invalid="ignore"):
+                result &= fn(self.column(name), float(value))
+        return result
+
+    def threshold_mask(self, interval: str, vol_thresh: float, mcap_thresh: float) -> np.ndarray:
+        """Vectorized equivalent of the build_filtered_collections rule for one interval."""
+        target = normalize_interval(interval)
+        volume = self.column(f"{target}_volume")
+        average_price = self.column(f"{target}_average_price")
+        with np.errstate(invalid="ignore"):
+            return (volume > vol_thresh) & (np.isnan(average_price) | (average_price > mcap_thresh))
+
+    def select(self, mask: np.ndarray) -> "StatsTable":
+        return StatsTable(self.slugs[mask], {name: col[mask] for name, col in self.columns.items()})
+
+    def rank(self, mask: Optional[np.ndarray] = None, sort_by: Optional[str] = None,
+             k: Optional[int] = None, descending: bool = True) -> np.ndarray:
+        """
+        Row indices passing `mask`, ordered by `sort_by` (NaN last; input order if None), first `k` only.
+        Works on indices so no column is copied.
+        """
+        idx = np.flatnonzero(mask) if mask is not None else np.arange(len(self))
+        if sort_by is None:
+            return idx[:k] if k is not None else idx
+        values = self.column(sort_by)[idx]
+        keys = np.where(np.isnan(values), np.inf, -values if descending else values)
+        if k is not None and k < len(idx):
+            # partial selection first so only the k winners get sorted
+            part = np.argpartition(keys, k)[:k]
+            return idx[part[np.argsort(keys[part], kind="stable")]]
+        return idx[np.argsort(keys, kind="stable")][:k]
+
+    def take(self, indices: np.ndarray) -> "StatsTable":
+        return StatsTable(self.slugs[indices], {name: col[indices] for name, col in self.columns.items()})
+
+    def top_k(self, column: str, k: Optional[int] = None, descending: bool = True) -> "StatsTable":
+        """Rows ordered by `column` (NaN last), keeping the first `k`."""
+        return self.take(self.rank(sort_by=column, k=k, descending=descending))
+
+    def rows(self, columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        names = list(columns) if columns is not None else list(COLUMNS)
+        cols = [self.column(name) for name in names]
+        return [
+            {"slug": slug, **{name: (None if np.isnan(col[i]) else float(col[i])) for name, col in zip(names, cols)}}
+            for i, slug in enumerate(self.slugs)
+        ]
+
+
+_table_lock = threading.Lock()
+_table_version = -1
+_table: Optional[StatsTable] = None
+
+
+def cached_stats_table() -> StatsTable:
+    """StatsTable over everything in the stats cache; rebuilt only when the cache has changed."""
+    global _table_version, _table
+    with _table_lock:
+        version = stats_cache.version
+        if _table is None or version != _table_version:
+            _table = StatsTable.from_stats(stats_cache.items())
+            _table_version = version
+        return _table
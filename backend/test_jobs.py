@@ -0,0 +1,74 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (c) 2025 Danila Novik & Heorhi Shtsivel
+
+import threading
+import time
+
+from jobs import JobManager, CANCELLED, DONE
+
+
+def _wait_for(job, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if job.finished_at is not None:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"job {job.id} did not finish (status {job.status})")
+
+
+def test_resubmit_after_cancel_starts_new_job():
+    manager = JobManager(max_workers=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def work(job):
+        started.set()
+        while not release.wait(0.01):
+            job.check_cancelled()
+        return "finished"
+
+    first, created = manager.submit("pipeline", {"chain": "base"}, work)
+    assert created
+    assert started.wait(5)
+    manager.cancel(first.id)
+
+    second, created = manager.submit("pipeline", {"chain": "base"}, lambda job: "second")
+    assert created
+    assert second.id != first.id
+
+    _wait_for(first)
+    _wait_for(second)
+    assert first.status == CANCELLED
+    assert second.status == DONE
+    assert second.result == "second"
+    manager.shutdown()
+
+
+def test_resubmit_after_cancelling_pending_job():
+    manager = JobManager(max_workers=1)
+    release = threading.Event()
+    blocker, _ = manager.submit("block", {}, lambda job: release.wait(5))
+    pending, _ = manager.submit("pipeline", {"chain": "base"}, lambda job: "first")
+    manager.cancel(pending.id)
+
+    again, created = manager.submit("pipeline", {"chain": "base"}, lambda job: "again")
+    assert created
+    release.set()
+    _wait_for(pending)
+    _wait_for(again)
+    assert pending.status == CANCELLED
+    assert again.status == DONE
+    _wait_for(blocker)
+    manager.shutdown()
+
+
+def test_identical_active_job_is_deduplicated():
+    manager = JobManager(max_workers=1)
+    release = threading.Event()
+    job, created = manager.submit("pipeline", {"chain": "base"}, lambda job: release.wait(5))
+    same, created_again = manager.submit("pipeline", {"chain": "base"}, lambda job: None)
+    assert created and not created_again
+    assert same is job
+    release.set()
+    _wait_for(job)
+    manager.shutdown()
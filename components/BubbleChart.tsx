@@ -5,8 +5,11 @@ import { useEffect, useMemo, useRef, useState, type CSSProperties } from 'react'
 type Item = {
   name: string;
   floorEth: number;
-  change24hPct: number;
+  // null when the backend has no floor from ~24h ago
+  change24hPct: number | null;
   image?: string;
+  // key of the backend thumbnail (/api/images/{key}); the full-size image is the fallback
+  imageKey?: string;
   link?: string;
 };
 
@@ -18,6 +21,17 @@ type Node = Item & {
   fy?: number | null;
 };
 
+// thumbnail sizes cached by the backend (image_cache.THUMB_SIZES); the image covers 70% of the bubble
+function thumbSize(r: number): number {
+  const px = r * 2 * 0.7 * (typeof window !== 'undefined' ? window.devicePixelRatio || 1 : 1);
+  return px <= 96 ? 96 : 256;
+}
+
+// an unknown change is drawn as the smallest bubble
+function magnitude(pct: number | null): number {
+  return pct === null ? 0 : Math.abs(pct);
+}
+
 export default function BubbleChart({ data }: { data: Item[] }) {
   const containerRef = useRef<HTMLDivElement>(null);
   const [dims, setDims] = useState({ width: 0, height: 0 });
@@ -27,7 +41,7 @@ export default function BubbleChart({ data }: { data: Item[] }) {
   const [hovered, setHovered] = useState<Node | null>(null);
 
   const radii = useMemo(() => {
-    const maxAbs = d3.max(data, (d: Item) => Math.abs(d.change24hPct)) || 1;
+    const maxAbs = d3.max(data, (d: Item) => magnitude(d.change24hPct)) || 1;
     const scale = (dims.width || 1100) / 1100;
     const sizeMultiplier = 1.7;
     return d3
@@ -42,7 +56,7 @@ export default function BubbleChart({ data }: { data: Item[] }) {
       ...d,
       x: Math.random() * dims.width,
       y: Math.random() * dims.height,
-      r: radii(Math.abs(d.change24hPct)),
+      r: radii(magnitude(d.change24hPct)),
     }));
     setNodes(init);
   }, [data, dims.width, dims.height, radii]);
@@ -50,7 +64,7 @@ export default function BubbleChart({ data }: { data: Item[] }) {
   useEffect(() => {
     setNodes(ns => {
       ns.forEach(n => {
-        n.r = radii(Math.abs(n.change24hPct));
+        n.r = radii(magnitude(n.change24hPct));
       });
       return [...ns];
     });
@@ -110,8 +124,8 @@ export default function BubbleChart({ data }: { data: Item[] }) {
     return () => void sim.stop();
   }, [nodes.length, dims.width, dims.height]);
 
-  const borderColor = (v: number) =>
-    v > 0 ? '#0bd65e' : v < 0 ? '#ff4d4d' : '#667';
+  const borderColor = (v: number | null) =>
+    v === null ? '#3a3d45' : v > 0 ? '#0bd65e' : v < 0 ? '#ff4d4d' : '#667';
 
   const sparkline = useMemo(() => {
     if (!hovered) return null;
@@ -188,7 +202,10 @@ export default function BubbleChart({ data }: { data: Item[] }) {
           >
             {n.image && (
               <img
-                src={n.image}
+                src={n.imageKey ? `/api/images/${n.imageKey}?size=${thumbSize(n.r)}` : n.image}
+                onError={(e) => {
+                  if (n.image && e.currentTarget.src !== n.image) e.currentTarget.src = n.image;
+                }}
                 alt={n.name}
                 style={{
                   position: 'absolute',
@@ -285,15 +302,18 @@ export default function BubbleChart({ data }: { data: Item[] }) {
             <span
               style={{
                 color:
-                  hovered.change24hPct > 0
-                    ? '#0bd65e'
-                    : hovered.change24hPct < 0
-                      ? '#ff4d4d'
-                      : '#dfe3ea',
+                  hovered.change24hPct === null
+                    ? '#8a8f99'
+                    : hovered.change24hPct > 0
+                      ? '#0bd65e'
+                      : hovered.change24hPct < 0
+                        ? '#ff4d4d'
+                        : '#dfe3ea',
               }}
             >
-              {hovered.change24hPct > 0 ? '+' : ''}
-              {hovered.change24hPct}%
+              {hovered.change24hPct === null
+                ? 'no 24h data'
+                : `${hovered.change24hPct > 0 ? '+' : ''}${hovered.change24hPct}%`}
             </span>
           </div>
           <svg